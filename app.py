@@ -1,12 +1,18 @@
 import time
 import webbrowser
 import threading
+import collections
+import contextlib
+import math
+import queue
 import sqlite3
 import cv2
 import yt_dlp
 import numpy as np
 import os
 import re
+import socket
+import struct
 import psutil
 import json
 import logging
@@ -20,10 +26,10 @@ from datetime import datetime
 from dotenv import load_dotenv
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
-from flask import Flask, Response, request, jsonify, g, send_from_directory, stream_with_context, session, send_file
+from flask import Flask, Response, request, jsonify, g, send_from_directory, session, send_file
 from flask_cors import CORS
 from ultralytics import YOLO
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, Future, wait as futures_wait
 from tabulate import tabulate
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
@@ -59,6 +65,24 @@ output_resolution = (1920, 1080)
 stream_frame_skip = 0  # Only process 1 out of every 2 frames (adjust as needed)
 max_frame_rate = 30
 playback_recording = False
+recording_queue_size = 15  # Frames buffered between a stream and its recorder (about 6 MB each at 1080p)
+recording_drop_policy = "drop_oldest"  # drop_oldest or degrade_fps when the recorder falls behind
+recording_mode = "reencode"  # reencode: record the annotated frames, passthrough: stream-copy the camera feed, event: clips around detections
+event_preroll_seconds = 5  # Seconds kept in memory before a detection
+event_postroll_seconds = 10  # Seconds recorded after the last detection
+event_max_clip_seconds = 120  # Longest single event clip
+retention_enabled = True
+retention_interval = 300  # Seconds between retention passes over the playback folders
+retention_max_age_hours = 72  # Segments older than this are deleted
+retention_max_gb = 20  # Per-camera playback size quota, oldest segments go first
+retention_quotas = {}  # Per-camera overrides, e.g. {"3": {"max_age_hours": 24, "max_gb": 5}}
+compaction_after_hours = 1  # Segments older than this are merged into one file per hour
+session_idle_timeout = 30  # Seconds a camera session keeps running after its last viewer leaves
+frame_buffer_size = 8  # Processed frames kept in each camera's ring buffer
+capture_mode = "latest"  # latest: reader thread keeps only the newest frame, sequential: read every frame in order
+jpeg_quality = 80  # JPEG quality (0 to 100) for the live MJPEG feed
+jpeg_chroma_subsampling = "420"  # 411, 420, 422, 440 or 444
+jpeg_encoder_threads = 2  # Size of the shared JPEG encoder pool (applied at startup)
 
 # Detection Settings variables
 detection_mode = False
@@ -66,10 +90,23 @@ model_version = "cffl-6.3.11n-18.8k-100eph"
 show_bounding_box = False
 show_confidence_value = False
 confidence_level = 0.85
+inference_size = 640  # Side of the letterboxed square image fed to YOLO
+model_cache_size = 3  # Loaded models kept in memory for instant switching
 enable_alert = False
 enable_mobile_alert = False
 enable_record_logging = False
 delay_for_alert_and_record_logging = 20
+inference_max_batch = 8  # Max frames from all cameras run through YOLO in one batch
+inference_max_wait_ms = 20  # Max time the oldest frame waits for a batch to fill
+inference_timeout = 10  # Seconds a stream waits for its frame's result before showing it without detections
+motion_gate_enabled = True  # Skip YOLO on static scenes
+motion_threshold = 0.01  # Fraction of thumbnail pixels that must change to count as motion
+motion_thresholds = {}  # Per-camera overrides, e.g. {"3": 0.03}
+motion_pixel_delta = 25  # Gray-level change for a thumbnail pixel to count as changed
+motion_hold_seconds = 3  # Keep detecting every frame this long after the last motion
+motion_static_interval = 2  # Seconds between detections while a scene is static
+motion_thumbnail_size = (64, 36)
+motion_rate_window = 10  # Seconds used for the effective inference rate
 
 # Alert sound variables
 alert_sound = False
@@ -90,6 +127,22 @@ setting_vars = {
     "stream_frame_skip": "stream_frame_skip",
     "max_frame_rate": "max_frame_rate",
     "playback_recording": "playback_recording",
+    "recording_queue_size": "recording_queue_size",
+    "recording_drop_policy": "recording_drop_policy",
+    "recording_mode": "recording_mode",
+    "event_preroll_seconds": "event_preroll_seconds",
+    "event_postroll_seconds": "event_postroll_seconds",
+    "event_max_clip_seconds": "event_max_clip_seconds",
+    "retention_enabled": "retention_enabled",
+    "retention_interval": "retention_interval",
+    "retention_max_age_hours": "retention_max_age_hours",
+    "retention_max_gb": "retention_max_gb",
+    "retention_quotas": "retention_quotas",
+    "compaction_after_hours": "compaction_after_hours",
+    "session_idle_timeout": "session_idle_timeout",
+    "capture_mode": "capture_mode",
+    "jpeg_quality": "jpeg_quality",
+    "jpeg_chroma_subsampling": "jpeg_chroma_subsampling",
     
     # Model
     "detection_mode": "detection_mode",
@@ -97,10 +150,19 @@ setting_vars = {
     "show_bounding_box": "show_bounding_box",
     "show_confidence_value": "show_confidence_value",
     "confidence_level": "confidence_level",
+    "inference_size": "inference_size",
     "enable_alert": "enable_alert",
     "enable_mobile_alert": "enable_mobile_alert",
     "enable_record_logging": "enable_record_logging",
     "delay_for_alert_and_record_logging": "delay_for_alert_and_record_logging",
+    "inference_max_batch": "inference_max_batch",
+    "inference_max_wait_ms": "inference_max_wait_ms",
+    "inference_timeout": "inference_timeout",
+    "motion_gate_enabled": "motion_gate_enabled",
+    "motion_threshold": "motion_threshold",
+    "motion_thresholds": "motion_thresholds",
+    "motion_hold_seconds": "motion_hold_seconds",
+    "motion_static_interval": "motion_static_interval",
     
     # Alert sound
     "alert_sound": "alert_sound",
@@ -109,14 +171,109 @@ setting_vars = {
     "alert_sound_name": "alert_sound_name"
 }
 
-MODEL_PATHS = [f"model/{model_version}.pt"]
 device = 'cuda' if torch.cuda.is_available() else 'cpu'
 print(f"YOLO is running on: {device.upper()}")
-model = YOLO(MODEL_PATHS[0]).to(device)
+
+# SECTION: Model Registry with Background Loading and Hot Swap
+class ModelRegistry:
+    """Loads YOLO models on a background worker and keeps recently used ones in a small LRU cache."""
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.models = collections.OrderedDict()  # model_version -> loaded YOLO model, oldest first
+        self.status = {}  # model_version -> load state and timings
+        self.lock = threading.Lock()
+        self.loader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-loader")
+        self.active_version = None
+
+    def set_status(self, version, state, **timings):
+        with self.lock:
+            entry = self.status.setdefault(version, {})
+            entry["state"] = state
+            entry["updated_at"] = time.time()
+            entry.update(timings)
+
+    def load(self, version):
+        """Load, fuse and warm up a model. Runs on the loader thread (or once at startup)."""
+        path = f"model/{version}.pt"
+        load_start = time.time()
+        self.set_status(version, "loading", started_at=load_start)
+        loaded_model = YOLO(path).to(device)
+
+        fuse_start = time.time()
+        self.set_status(version, "fusing", load_seconds=fuse_start - load_start)
+        loaded_model.fuse()
+
+        warmup_start = time.time()
+        self.set_status(version, "warming_up", fuse_seconds=warmup_start - fuse_start)
+        dummy_frame = np.zeros((inference_size, inference_size, 3), dtype=np.uint8)
+        loaded_model([dummy_frame] * max(1, int(inference_max_batch)), verbose=False, imgsz=inference_size)
+
+        ready_time = time.time()
+        self.set_status(version, "ready", warmup_seconds=ready_time - warmup_start, total_seconds=ready_time - load_start)
+        return loaded_model
+
+    def activate(self, version):
+        """Swap the live model. Batches already running keep the model they started with."""
+        global model
+        with self.lock:
+            self.models.move_to_end(version)
+            model = self.models[version]
+            self.active_version = version
+
+            # Evict least recently used models beyond capacity, never the active one
+            while len(self.models) > max(1, int(self.capacity)):
+                oldest_version = next(iter(self.models))
+                if oldest_version == self.active_version:
+                    break
+                self.models.pop(oldest_version)
+                self.status.pop(oldest_version, None)
+        print(f"Model {version} is now active.")
+
+    def load_and_activate(self, version):
+        try:
+            loaded_model = self.load(version)
+        except Exception as e:
+            self.set_status(version, "failed", error=str(e))
+            print(f"Error loading model {version}: {e}")
+            return
+
+        with self.lock:
+            self.models[version] = loaded_model
+        if version == model_version:  # Skip if a newer switch was requested while loading
+            self.activate(version)
+
+    def request_switch(self, version):
+        """Switch to version without blocking: instant if cached, otherwise loaded in the background."""
+        with self.lock:
+            if version == self.active_version:
+                return
+            cached = version in self.models
+            in_progress = self.status.get(version, {}).get("state") in ("queued", "loading", "fusing", "warming_up")
+
+        if cached:
+            self.activate(version)
+        elif not in_progress:
+            self.set_status(version, "queued")
+            self.loader.submit(self.load_and_activate, version)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "active_version": self.active_version,
+                "requested_version": model_version,
+                "cached_versions": list(self.models.keys()),
+                "capacity": self.capacity,
+                "status": {version: dict(entry) for version, entry in self.status.items()}
+            }
+
+model = None
+model_registry = ModelRegistry(model_cache_size)
+model_registry.load_and_activate(model_version)  # Load the startup model synchronously
 
 # constant varaibles (Do Not Touch)
 active_streams = 0
-active_streams_dict = {}  # Track active streams by device ID
+capture_sessions = {}  # One shared CaptureSession per device ID
+capture_sessions_lock = threading.Lock()
 last_record_times = {}  # Dictionary to store last save time per stream
 
 #resolution options
@@ -156,9 +313,6 @@ def check_and_update_yt_dlp():
         subprocess.run(["pip", "install", "--upgrade", "yt-dlp"])
     else:
         print("yt-dlp is already up to date or not installed.")
-        
-# Run the function
-check_and_update_yt_dlp()
 
 #Flask App Initialization with CORS and Pygame
 app = Flask(__name__, static_folder=".") # Initialize Flask application
@@ -190,6 +344,145 @@ def start_file_watcher():
         observer.stop()
     observer.join()
 
+# SECTION: Pipeline Instrumentation (per-stage histograms, counters and /metrics)
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.total += value
+        for i, upper_bound in enumerate(self.buckets):
+            if value <= upper_bound:
+                self.bucket_counts[i] += 1
+                break
+
+    def cumulative_counts(self):
+        cumulative, running = [], 0
+        for count in self.bucket_counts:
+            running += count
+            cumulative.append(running)
+        return cumulative
+
+    def quantile(self, q):
+        """
+        Upper bound of the bucket holding the q-quantile (Prometheus-style estimate). Values past the
+        last bucket report that bucket's bound, so the result stays valid JSON.
+        """
+        if self.count == 0:
+            return 0.0
+        target = q * self.count
+        for upper_bound, cumulative in zip(self.buckets, self.cumulative_counts()):
+            if cumulative >= target:
+                return upper_bound
+        return self.buckets[-1]
+
+class MetricsRegistry:
+    """Thread-safe histograms and counters keyed by metric name and labels."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}  # (name, labels) -> Histogram
+        self.counters = {}  # (name, labels) -> float
+        self.help = {}
+
+    def describe(self, name, help_text):
+        self.help[name] = help_text
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(metric_buckets)
+            histogram.observe(value)
+
+    def increment(self, name, amount=1, **labels):
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe_stages(self, camera, stage_times):
+        for stage, seconds in stage_times.items():
+            self.observe("luka_stage_duration_seconds", seconds, camera=camera, stage=stage)
+
+    def render_prometheus(self):
+        def format_labels(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            escaped = []
+            for key, value in pairs:
+                value = value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+                escaped.append(f'{key}="{value}"')
+            return "{" + ",".join(escaped) + "}"
+
+        lines = []
+        with self.lock:
+            histogram_names = sorted({name for name, _ in self.histograms})
+            for name in histogram_names:
+                lines.append(f"# HELP {name} {self.help.get(name, name)}")
+                lines.append(f"# TYPE {name} histogram")
+                for (metric_name, labels), histogram in sorted(self.histograms.items()):
+                    if metric_name != name:
+                        continue
+                    for upper_bound, cumulative in zip(histogram.buckets, histogram.cumulative_counts()):
+                        lines.append(f"{name}_bucket{format_labels(labels, [('le', str(upper_bound))])} {cumulative}")
+                    lines.append(f"{name}_bucket{format_labels(labels, [('le', '+Inf')])} {histogram.count}")
+                    lines.append(f"{name}_sum{format_labels(labels)} {histogram.total}")
+                    lines.append(f"{name}_count{format_labels(labels)} {histogram.count}")
+
+            counter_names = sorted({name for name, _ in self.counters})
+            for name in counter_names:
+                lines.append(f"# HELP {name} {self.help.get(name, name)}")
+                lines.append(f"# TYPE {name} counter")
+                for (metric_name, labels), value in sorted(self.counters.items()):
+                    if metric_name == name:
+                        lines.append(f"{name}{format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        with self.lock:
+            histograms = [
+                {
+                    "name": name,
+                    "labels": dict(labels),
+                    "count": histogram.count,
+                    "sum": histogram.total,
+                    "avg": histogram.total / histogram.count if histogram.count else 0,
+                    "p50": histogram.quantile(0.50),
+                    "p95": histogram.quantile(0.95),
+                    "p99": histogram.quantile(0.99)
+                }
+                for (name, labels), histogram in sorted(self.histograms.items())
+            ]
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self.counters.items())
+            ]
+        return {"histograms": histograms, "counters": counters}
+
+metric_buckets = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+pipeline_metrics = MetricsRegistry()
+pipeline_metrics.describe("luka_stage_duration_seconds", "Time spent in each stage of the streaming pipeline.")
+pipeline_metrics.describe("luka_db_write_duration_seconds", "Latency of database writes.")
+pipeline_metrics.describe("luka_reconnects_total", "Stream reconnect attempts per camera.")
+pipeline_metrics.describe("luka_dropped_frames_total", "Captured frames replaced by a newer frame before processing.")
+pipeline_metrics.describe("luka_alerts_fired_total", "Alerts written to the alert table.")
+pipeline_metrics.describe("luka_recording_dropped_frames_total", "Frames the playback recorder dropped to keep up.")
+
+@app.route('/metrics', methods=['GET'])
+def metrics_prometheus():
+    """Prometheus text exposition of pipeline histograms and counters."""
+    return Response(pipeline_metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/metrics.json', methods=['GET'])
+def metrics_json():
+    """Same metrics as /metrics, with p50/p95/p99 estimates, as JSON."""
+    return jsonify(pipeline_metrics.snapshot())
+
 # SECTION: YouTube Stream Handling and Initialization
 def get_youtube_stream_url(youtube_url):
     ydl_opts = {'format': 'best', 'quiet': True}
@@ -215,36 +508,335 @@ def initialize_stream(stream_url, device_title):
         return None
     return cap
 
+class FrameGrabber:
+    """Drains a VideoCapture on its own thread so the reader always gets the newest frame."""
+    def __init__(self, cap, counters, device_id):
+        self.cap = cap
+        self.counters = counters
+        self.device_id = device_id
+        self.condition = threading.Condition()
+        self.frame = None
+        self.sequence = 0
+        self.read_sequence = 0
+        self.failed = False
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name="frame-grabber", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        try:
+            while self.running:
+                success, frame = self.cap.read()
+                with self.condition:
+                    if not success:
+                        self.failed = True
+                        self.condition.notify_all()
+                        return
+                    if self.sequence > self.read_sequence:
+                        self.counters["frames_dropped"] += 1  # Previous frame was never picked up
+                        pipeline_metrics.increment("luka_dropped_frames_total", camera=self.device_id)
+                    self.frame = frame
+                    self.sequence += 1
+                    self.counters["frames_grabbed"] += 1
+                    self.condition.notify_all()
+        finally:
+            self.cap.release()  # Grabber thread owns the capture, release it here
+
+    def read(self, timeout=5.0):
+        """Return the newest frame not yet read, same (success, frame) shape as VideoCapture.read()."""
+        with self.condition:
+            self.condition.wait_for(lambda: self.sequence > self.read_sequence or self.failed, timeout)
+            if self.sequence <= self.read_sequence:
+                return False, None
+            self.read_sequence = self.sequence
+            return True, self.frame
+
+    def set(self, prop_id, value):
+        return self.cap.set(prop_id, value)
+
+    def isOpened(self):
+        return not self.failed and self.cap.isOpened()
+
+    def release(self):
+        self.running = False
+
+def open_capture(stream_url, device_title, device_id, counters):
+    """Open and configure a capture for the current capture_mode."""
+    source_url = get_fresh_stream(stream_url)
+    if not source_url:
+        print(f"Could not resolve stream URL for {device_title}")
+        return None
+    cap = initialize_stream(source_url, device_title)
+    if cap is None:
+        return None
+    setup_stream_resolution(cap)
+
+    if capture_mode == "latest":
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # Don't let OpenCV queue stale frames
+        cap = FrameGrabber(cap, counters, device_id)
+    return cap
+
+# SECTION: Batched YOLO Inference Scheduler (shared by all camera sessions)
+class InferenceRequest:
+    def __init__(self, frame):
+        self.frame = frame
+        self.submitted_at = time.time()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class InferenceScheduler:
+    """Collects pending frames from every stream and runs them through the model as one batch."""
+    def __init__(self):
+        self.pending = collections.deque()
+        self.condition = threading.Condition()
+        self.stats_lock = threading.Lock()
+        self.recent_batch_sizes = collections.deque(maxlen=200)
+        self.recent_queue_waits = collections.deque(maxlen=200)
+        self.batches_run = 0
+        self.frames_processed = 0
+        self.thread = threading.Thread(target=self.run, name="inference-scheduler", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def submit(self, frame):
+        """Queue a frame for the next batch and block until its result is ready (TimeoutError after inference_timeout)."""
+        inference_request = InferenceRequest(frame)
+        with self.condition:
+            self.pending.append(inference_request)
+            self.condition.notify()
+        if not inference_request.done.wait(inference_timeout):
+            with self.condition:
+                if inference_request in self.pending:
+                    self.pending.remove(inference_request)
+            raise TimeoutError(f"No inference result within {inference_timeout}s")
+        if inference_request.error is not None:
+            raise inference_request.error
+        return inference_request.result
+
+    def collect_batch(self):
+        with self.condition:
+            while not self.pending:
+                self.condition.wait()
+
+            # Keep collecting until the batch is full or the oldest frame hits the deadline
+            max_batch = max(1, int(inference_max_batch))
+            deadline = self.pending[0].submitted_at + float(inference_max_wait_ms) / 1000.0
+            while len(self.pending) < max_batch:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+
+            batch_size = min(len(self.pending), max_batch)
+            return [self.pending.popleft() for _ in range(batch_size)]
+
+    def run(self):
+        while True:
+            batch = []
+            try:
+                batch = self.collect_batch()
+                batch_start = time.time()
+                try:
+                    active_model = model  # Capture once so a hot swap never splits a batch
+                    results = active_model([inference_request.frame for inference_request in batch], verbose=False, conf=confidence_level, imgsz=inference_size)
+                    for inference_request, result in zip(batch, results):
+                        inference_request.result = [result]
+                except Exception as e:
+                    print(f"Batched inference failed: {e}")
+                    for inference_request in batch:
+                        inference_request.error = e
+
+                with self.stats_lock:
+                    self.batches_run += 1
+                    self.frames_processed += len(batch)
+                    self.recent_batch_sizes.append(len(batch))
+                    self.recent_queue_waits.extend(batch_start - inference_request.submitted_at for inference_request in batch)
+            except Exception as e:
+                # e.g. a bad inference_max_batch from /update_settings; fail the waiting frames and keep serving
+                print(f"Inference scheduler error: {e}")
+                with self.condition:
+                    if not batch:
+                        batch = list(self.pending)
+                        self.pending.clear()
+                for inference_request in batch:
+                    if inference_request.result is None:
+                        inference_request.error = e
+                time.sleep(0.1)
+            finally:
+                for inference_request in batch:
+                    inference_request.done.set()
+
+    def stats(self):
+        with self.stats_lock:
+            batch_sizes = list(self.recent_batch_sizes)
+            queue_waits = list(self.recent_queue_waits)
+            batches_run = self.batches_run
+            frames_processed = self.frames_processed
+        with self.condition:
+            queue_depth = len(self.pending)
+
+        return {
+            "max_batch": inference_max_batch,
+            "max_wait_ms": inference_max_wait_ms,
+            "queue_depth": queue_depth,
+            "batches_run": batches_run,
+            "frames_processed": frames_processed,
+            "avg_batch_size": sum(batch_sizes) / len(batch_sizes) if batch_sizes else 0,
+            "max_batch_size": max(batch_sizes, default=0),
+            "avg_queue_wait_ms": 1000 * sum(queue_waits) / len(queue_waits) if queue_waits else 0,
+            "max_queue_wait_ms": 1000 * max(queue_waits, default=0)
+        }
+
+inference_scheduler = InferenceScheduler()
+inference_scheduler.start()
+
+@app.route('/inference/stats', methods=['GET'])
+def inference_stats():
+    """Batch size and queue wait figures for tuning inference_max_batch / inference_max_wait_ms."""
+    return jsonify(inference_scheduler.stats())
+
 # SECTION: Frame Processing with YOLO Detection & Object Highlighting
-def process_frame(frame, stream_url, device_title, device_location, device_id):
+def process_frame(frame, stream_url, device_title, device_location, device_id, source_frame=None, motion_gate=None, stage_times=None,
+                  detections=None):
     process_start = time.time()
     model_status_text = "Model: OFF"
     
     if detection_mode:
         model_status_text = "Model: ON"
-        frame, detected_objects = detect_objects(frame)
-        save_detected_frame(frame, stream_url, detected_objects, device_title, device_location, device_id)
+        run_detection = True
+        if motion_gate is not None and motion_gate_enabled:
+            run_detection = motion_gate.should_detect(frame if source_frame is None else source_frame)
+            model_status_text = f"Model: ON | Scene: {motion_gate.state()} | {motion_gate.inference_rate():.1f} inf/s"
+
+        if run_detection:
+            try:
+                frame, detected_objects = detect_objects(frame, source_frame, stage_times, detections)
+                save_detected_frame(frame, stream_url, detected_objects, device_title, device_location, device_id)
+            except Exception as e:  # Scheduler timeout or model failure: keep the feed live without detections
+                print(f"Skipping detection for {device_title}: {e}")
+                model_status_text = "Model: ERROR"
     
     processing_time = time.time() - process_start
     return frame, processing_time, model_status_text
 
-def detect_objects(frame):
+class MotionGate:
+    """Cheap frame-difference check that decides whether a camera needs YOLO on this frame."""
+    def __init__(self, device_id):
+        self.device_id = device_id
+        self.previous_thumbnail = None
+        self.motion_score = 0.0
+        self.last_motion_time = 0.0
+        self.last_inference_time = 0.0
+        self.active = True
+        self.inference_times = collections.deque()  # Timestamps of recent inferences for the rate estimate
+
+    def should_detect(self, frame):
+        now = time.time()
+        thumbnail = cv2.resize(frame, motion_thumbnail_size, interpolation=cv2.INTER_AREA)
+        thumbnail = cv2.cvtColor(thumbnail, cv2.COLOR_BGR2GRAY)
+
+        if self.previous_thumbnail is None:
+            self.motion_score = 1.0  # No reference yet, treat as motion
+        else:
+            diff = cv2.absdiff(thumbnail, self.previous_thumbnail)
+            _, changed = cv2.threshold(diff, motion_pixel_delta, 255, cv2.THRESH_BINARY)
+            self.motion_score = cv2.countNonZero(changed) / changed.size
+        self.previous_thumbnail = thumbnail
+
+        threshold = motion_thresholds.get(str(self.device_id), motion_threshold)
+        if self.motion_score >= threshold:
+            self.last_motion_time = now
+        self.active = now - self.last_motion_time <= motion_hold_seconds
+
+        # Active scenes run every frame, static scenes fall back to one check per interval
+        detect = self.active or now - self.last_inference_time >= motion_static_interval
+        if detect:
+            self.last_inference_time = now
+            self.inference_times.append(now)
+        while self.inference_times and now - self.inference_times[0] > motion_rate_window:
+            self.inference_times.popleft()
+        return detect
+
+    def state(self):
+        return "ACTIVE" if self.active else "STATIC"
+
+    def inference_rate(self):
+        return len(self.inference_times) / motion_rate_window
+
+    def stats(self):
+        return {
+            "enabled": motion_gate_enabled,
+            "state": self.state(),
+            "motion_score": round(self.motion_score, 4),
+            "threshold": motion_thresholds.get(str(self.device_id), motion_threshold),
+            "inference_rate": round(self.inference_rate(), 2)
+        }
+
+def letterbox_frame(frame, size):
+    """Resize frame to fit inside a size x size square and pad the rest, like YOLO's letterbox."""
+    height, width = frame.shape[:2]
+    scale = min(size / width, size / height)
+    new_width, new_height = int(round(width * scale)), int(round(height * scale))
+    interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+    resized = cv2.resize(frame, (new_width, new_height), interpolation=interpolation)
+
+    pad_x = (size - new_width) // 2
+    pad_y = (size - new_height) // 2
+    letterboxed = cv2.copyMakeBorder(resized, pad_y, size - new_height - pad_y, pad_x, size - new_width - pad_x,
+                                     cv2.BORDER_CONSTANT, value=(114, 114, 114))
+    return letterboxed, scale, pad_x, pad_y
+
+def detect_objects(frame, source_frame=None, stage_times=None, detections=None):
+    """
+    Run YOLO on a model-sized letterboxed copy of source_frame and draw results on frame.
+    If a detections list is given, each box is appended to it in normalized output coordinates.
+    """
     global mark_screen_duration
     detected_objects = set()
     object_detected = False  # Track if an object was detected in this frame
-    
-    results = model(frame, verbose=False, conf=confidence_level)
+
+    if source_frame is None:
+        source_frame = frame
+    if stage_times is None:
+        stage_times = {}
+
+    inference_start = time.time()
+    model_input, scale, pad_x, pad_y = letterbox_frame(source_frame, inference_size)
+    results = inference_scheduler.submit(model_input)
+    drawing_start = time.time()
+    stage_times["inference"] = drawing_start - inference_start
+
+    # Map letterboxed model coordinates back onto the output frame
+    output_height, output_width = frame.shape[:2]
+    source_height, source_width = source_frame.shape[:2]
+    scale_x = output_width / (source_width * scale)
+    scale_y = output_height / (source_height * scale)
         
     for result in results:
         for box in result.boxes:
             class_id = int(box.cls)
-            class_name = model.names[class_id]  # Get the class name from the model
+            class_name = result.names[class_id]  # Names from the model that produced this result
             detected_objects.add(class_name)
             object_detected = True  # Mark that an object is detected
 
+            bx1, by1, bx2, by2 = box.xyxy[0].tolist()
+            x1 = min(max(int((bx1 - pad_x) * scale_x), 0), output_width - 1)
+            y1 = min(max(int((by1 - pad_y) * scale_y), 0), output_height - 1)
+            x2 = min(max(int((bx2 - pad_x) * scale_x), 0), output_width - 1)
+            y2 = min(max(int((by2 - pad_y) * scale_y), 0), output_height - 1)
+
+            if detections is not None:
+                detections.append({
+                    "class": class_name,
+                    "confidence": round(box.conf[0].item(), 3),
+                    "box": [round(x1 / output_width, 4), round(y1 / output_height, 4),
+                            round(x2 / output_width, 4), round(y2 / output_height, 4)]
+                })
+
             if show_bounding_box:
                 # Draw bounding box around detected objects
-                x1, y1, x2, y2 = map(int, box.xyxy[0])
                 color = (0, 255, 0)  # Green color for the bounding box
                 thickness = 5
                 cv2.rectangle(frame, (x1, y1), (x2, y2), color, thickness)
@@ -262,12 +854,79 @@ def detect_objects(frame):
                     text_x = x1
                     text_y = max(y1 - 5, text_size[1] + 5)  # Ensure text is inside the frame
                     cv2.putText(frame, label, (text_x, text_y), font, font_scale, text_color, font_thickness)
-                            
+
+    stage_times["drawing"] = time.time() - drawing_start
     return frame, detected_objects
     
 # SUBSECTION: Record and Alert Object Detected
+class AlertBus:
+    """
+    In-memory broadcast of newly inserted alerts. SSE clients block on the condition and read
+    from a short history, so an idle /stream_alerts connection costs no queries.
+    """
+    def __init__(self, history_size=256):
+        self.history = collections.deque(maxlen=history_size)
+        self.condition = threading.Condition()
+
+    def publish(self, alert):
+        with self.condition:
+            self.history.append(alert)
+            self.condition.notify_all()
+
+    def wait_for_alerts(self, last_id, timeout):
+        """
+        Alerts with id > last_id, waiting up to timeout for one to arrive. Returns None when the
+        client is further behind than the history reaches and has to catch up from the database.
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self.history and self.history[-1]["id"] > last_id, timeout)
+            if self.history and self.history[0]["id"] > last_id + 1 and len(self.history) == self.history.maxlen:
+                return None
+            return [alert for alert in self.history if alert["id"] > last_id]
+
+alert_bus = AlertBus()
+
+def record_alert(camera_id, camera_title, event_type, location, detected_at):
+    """
+    Queue an alert insert (plus its rollup counts) on the alert database's writer thread and
+    publish the alert to /stream_alerts subscribers once it is committed. Never waits for disk.
+    """
+    detected_epoch = int(time.time())
+
+    def insert(db):
+        alert_id = db.execute(
+            "INSERT INTO alert (camera_id, camera_title, event_type, location, detected_at, detected_epoch) VALUES (?, ?, ?, ?, ?, ?)",
+            (camera_id, camera_title, event_type, location, detected_at, detected_epoch)
+        ).lastrowid
+        update_alert_rollups(db, detected_epoch, event_type, location, camera_id)
+        return alert_id
+
+    def publish(future):
+        if future.exception() is not None:
+            return
+        alert_bus.publish({
+            "id": future.result(),
+            "camera_id": camera_id,
+            "camera_title": camera_title,
+            "event_type": event_type,
+            "alert_level": None,
+            "location": location,
+            "detected_at": detected_at,
+            "resolved": 0,
+            "detected_epoch": detected_epoch
+        })
+
+    pipeline_metrics.increment("luka_alerts_fired_total", event_type=event_type)
+    future = alert_database.submit(insert, table="alert")
+    future.add_done_callback(publish)
+    return future
+
 def save_detected_frame(frame, stream_url, detected_objects, device_title, device_location, device_id):
     global last_record_times
+
+    # Event recording follows every detection, independent of the alert/logging delay
+    if detected_objects & target_objects:
+        trigger_event_recording(device_id, detected_objects & target_objects)
     
     if not enable_record_logging and not enable_alert:  # Skip if both are disabled
         return
@@ -289,18 +948,7 @@ def save_detected_frame(frame, stream_url, detected_objects, device_title, devic
             cv2.imwrite(filename, frame)
 
         if enable_alert:
-            # Ensure database operations are executed inside the Flask app context
-            with app.app_context():
-                db = get_db()
-                cursor = db.cursor()
-                cursor.execute(
-                    """
-                    INSERT INTO alert (camera_id, camera_title, event_type, location, detected_at)
-                    VALUES (?, ?, ?, ?, ?)
-                    """,
-                    (device_id, device_title, detected_objects_str, device_location, formatted_timestamp)
-                )
-                db.commit()
+            record_alert(device_id, device_title, detected_objects_str, device_location, formatted_timestamp)
         
             # Play alert sound when an object is detected
             play_alert_sound()
@@ -339,10 +987,44 @@ def sanitize_filename(url):
     sanitized = re.sub(r'[^\w\-_.]', '_', url)  # Replace unsafe characters with '_'
     return sanitized[:50]  # Limit length to avoid filesystem issues
 
+jpeg_sampling_factors = {
+    "411": cv2.IMWRITE_JPEG_SAMPLING_FACTOR_411,
+    "420": cv2.IMWRITE_JPEG_SAMPLING_FACTOR_420,
+    "422": cv2.IMWRITE_JPEG_SAMPLING_FACTOR_422,
+    "440": cv2.IMWRITE_JPEG_SAMPLING_FACTOR_440,
+    "444": cv2.IMWRITE_JPEG_SAMPLING_FACTOR_444
+}
+
 def encode_frame(frame):
-    _, buffer = cv2.imencode('.jpg', frame)
+    params = [cv2.IMWRITE_JPEG_QUALITY, int(jpeg_quality)]
+    sampling_factor = jpeg_sampling_factors.get(str(jpeg_chroma_subsampling))
+    if sampling_factor is not None:
+        params += [cv2.IMWRITE_JPEG_SAMPLING_FACTOR, sampling_factor]
+    _, buffer = cv2.imencode('.jpg', frame, params)
     return buffer.tobytes()
 
+# cv2.imencode releases the GIL, so a small pool lets encoding overlap with the next frame's inference
+encode_executor = ThreadPoolExecutor(max_workers=jpeg_encoder_threads, thread_name_prefix="jpeg-encoder")
+
+def timed_encode_frame(frame, device_id):
+    encode_start = time.time()
+    encoded_frame = encode_frame(frame)
+    pipeline_metrics.observe("luka_stage_duration_seconds", time.time() - encode_start, camera=device_id, stage="jpeg_encode")
+    return encoded_frame
+
+class ProcessedFrame:
+    """A processed frame whose JPEG is encoded once on the encoder pool and shared by every viewer."""
+    def __init__(self, frame, device_id):
+        self.created_at = time.time()
+        self.encoded = encode_executor.submit(timed_encode_frame, frame, device_id)
+
+    def jpeg(self):
+        return self.encoded.result()
+
+    def wait(self):
+        """Block until the encode has finished (or failed)."""
+        futures_wait([self.encoded])
+
 def enforce_frame_rate(frame_start_time):
     if max_frame_rate > 0:
         time_to_wait = 1.0 / max_frame_rate - (time.time() - frame_start_time)
@@ -370,6 +1052,16 @@ def initialize_metrics():
         "displayed_active_streams": 0  # Track active streams
     }
 
+def sample_cpu_usage():
+    """Single background sampler so streams don't each poll psutil on every frame."""
+    global cpu_usage_percent
+    while True:
+        cpu_usage_percent = psutil.cpu_percent(interval=cpu_sample_interval)
+
+cpu_usage_percent = 0.0
+cpu_sample_interval = 1  # Seconds per CPU usage sample
+threading.Thread(target=sample_cpu_usage, name="cpu-sampler", daemon=True).start()
+
 def update_metrics(metrics, frame_start_time, processing_time, active_streams):
     metrics["frame_count"] += 1
     elapsed_time = time.time() - metrics["start_time"]
@@ -377,7 +1069,7 @@ def update_metrics(metrics, frame_start_time, processing_time, active_streams):
     fps = metrics["frame_count"] / elapsed_time if elapsed_time > 0 else 0
     # frame_rate = 1 / (frame_start_time - metrics["last_frame_time"]) if metrics["last_frame_time"] else 0
     real_time_lag = time.time() - frame_start_time  
-    cpu_usage = psutil.cpu_percent()  # Get current CPU usage
+    cpu_usage = cpu_usage_percent  # Shared value from the background CPU sampler
 
     metrics["last_frame_time"] = frame_start_time  
 
@@ -416,16 +1108,22 @@ def overlay_metrics(frame, metrics, model_status_text):
             f"Active Streams: {metrics['displayed_active_streams']}"
         ]
         
-        # Calculate background rectangle size
-        max_text_width = max([cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, font_scale, font_thickness)[0][0] for text in metrics_text])
-        bg_width = max_text_width + 20  # Add padding
-        bg_height = len(metrics_text) * line_spacing + 10  # Total height
+        # Calculate background rectangle size, only when the text or frame size changed
+        layout_key = (tuple(metrics_text), width, height, metric_font_size)
+        cached_layout = metrics.get("overlay_layout")
+        if cached_layout is None or cached_layout[0] != layout_key:
+            max_text_width = max([cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, font_scale, font_thickness)[0][0] for text in metrics_text])
+            bg_width = max_text_width + 20  # Add padding
+            bg_height = len(metrics_text) * line_spacing + 10  # Total height
+            panel = (max(start_x - 10, 0), max(start_y - 50, 0), min(start_x + bg_width, width), min(start_y + bg_height, height))
+            cached_layout = (layout_key, panel)
+            metrics["overlay_layout"] = cached_layout
+        x1, y1, x2, y2 = cached_layout[1]
         
-        # Draw background rectangle
-        overlay = frame.copy()
-        cv2.rectangle(overlay, (start_x - 10, start_y - 50), (start_x + bg_width, start_y + bg_height), (0, 0, 0), -1)
+        # Darken only the panel region instead of blending a full-frame copy
         alpha = 0.5
-        cv2.addWeighted(overlay, alpha, frame, 1 - alpha, 0, frame)
+        panel_region = frame[y1:y2, x1:x2]
+        frame[y1:y2, x1:x2] = cv2.addWeighted(panel_region, 1 - alpha, panel_region, 0, 0)
         
         for i, text in enumerate(metrics_text):
             y_position = start_y + (i * line_spacing)
@@ -433,75 +1131,133 @@ def overlay_metrics(frame, metrics, model_status_text):
     
     return frame
 
-def store_video_recording_ffmpeg(frame, device_id, device_title, device_location, writer, width, height):
-    """
-    Stores video recording in small .ts segments and maintains an .m3u8 playlist.
-    Continuously appends new segments to the playlist.
-    Handles dynamic updates of title and location while keeping device_id as constant.
-    """
-    # Find existing folder by device_id (first part of folder name)
-    existing_folder = None
+# SECTION: Playback Recording (one stateful HLS recorder per device)
+def sanitize_folder_part(text):
+    return "".join(c for c in text if c.isalnum() or c in (' ', '_')).rstrip()
+
+def playback_folder_name(device_id, device_title, device_location):
+    return f"{device_id}_{sanitize_folder_part(device_title)}_{sanitize_folder_part(device_location)}"
+
+def find_playback_folder(device_id):
+    """Find existing folder by device_id (first part of folder name)."""
     for folder in os.listdir(playback_path):
         if folder.startswith(f"{device_id}_"):
-            existing_folder = folder
-            break
-    
-    if existing_folder:
-        folder_name = existing_folder
-        # Update metadata if title or location changed
-        metadata_path = os.path.join(playback_path, folder_name, "metadata.json")
+            return folder
+    return None
+
+def write_playback_metadata(folder_name, device_id, device_title, device_location):
+    metadata_path = os.path.join(playback_path, folder_name, "metadata.json")
+    with open(metadata_path, 'w') as f:
+        json.dump({
+            'device_id': device_id,
+            'device_title': device_title,
+            'device_location': device_location
+        }, f)
+
+def apply_playback_metadata(folder_name, device_id, device_title, device_location):
+    """Rewrite metadata and rename the folder for a new title/location. Returns the folder name."""
+    write_playback_metadata(folder_name, device_id, device_title, device_location)
+    new_folder_name = playback_folder_name(device_id, device_title, device_location)
+    if new_folder_name != folder_name:
+        os.rename(os.path.join(playback_path, folder_name), os.path.join(playback_path, new_folder_name))
+    return new_folder_name
+
+def resolve_playback_folder(device_id, device_title, device_location):
+    """Find or create the device's playback folder, applying any title/location change made while idle."""
+    existing_folder = find_playback_folder(device_id)
+    if existing_folder is None:
+        folder_name = playback_folder_name(device_id, device_title, device_location)
+        os.makedirs(os.path.join(playback_path, folder_name), exist_ok=True)
+        write_playback_metadata(folder_name, device_id, device_title, device_location)
+        return folder_name
+
+    try:
+        with open(os.path.join(playback_path, existing_folder, "metadata.json"), 'r') as f:
+            metadata = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        metadata = {}
+    if metadata.get('device_title') != device_title or metadata.get('device_location') != device_location:
         try:
-            with open(metadata_path, 'r') as f:
-                metadata = json.load(f)
-            
-            if metadata.get('device_title') != device_title or metadata.get('device_location') != device_location:
-                # Update metadata
-                metadata['device_title'] = device_title
-                metadata['device_location'] = device_location
-                with open(metadata_path, 'w') as f:
-                    json.dump(metadata, f)
-                
-                # Rename folder if title or location changed
-                sanitized_title = "".join(c for c in device_title if c.isalnum() or c in (' ', '_')).rstrip()
-                sanitized_location = "".join(c for c in device_location if c.isalnum() or c in (' ', '_')).rstrip()
-                new_folder_name = f"{device_id}_{sanitized_title}_{sanitized_location}"
-                
-                if new_folder_name != folder_name:
-                    old_path = os.path.join(playback_path, folder_name)
-                    new_path = os.path.join(playback_path, new_folder_name)
-                    os.rename(old_path, new_path)
-                    folder_name = new_folder_name
+            return apply_playback_metadata(existing_folder, device_id, device_title, device_location)
         except Exception as e:
             print(f"Error updating metadata for {device_id}: {e}")
-    else:
-        # Create new folder if doesn't exist
-        sanitized_title = "".join(c for c in device_title if c.isalnum() or c in (' ', '_')).rstrip()
-        sanitized_location = "".join(c for c in device_location if c.isalnum() or c in (' ', '_')).rstrip()
-        folder_name = f"{device_id}_{sanitized_title}_{sanitized_location}"
-        os.makedirs(os.path.join(playback_path, folder_name), exist_ok=True)
-        
-        # Save initial metadata
-        metadata_path = os.path.join(playback_path, folder_name, "metadata.json")
-        with open(metadata_path, 'w') as f:
-            json.dump({
-                'device_id': device_id,
-                'device_title': device_title,
-                'device_location': device_location
-            }, f)
+    return existing_folder
 
-    device_folder_path = os.path.join(playback_path, folder_name)
-    segment_filename = os.path.join(device_folder_path, f"{device_id}_%03d.ts")
-    playlist_filename = os.path.join(device_folder_path, f"{device_id}.m3u8")
+class RateEstimator:
+    """Frames per second over a sliding window of frame timestamps."""
+    def __init__(self, window_seconds=3.0):
+        self.window_seconds = window_seconds
+        self.timestamps = collections.deque()
+
+    def add(self, timestamp):
+        self.timestamps.append(timestamp)
+        while self.timestamps and timestamp - self.timestamps[0] > self.window_seconds:
+            self.timestamps.popleft()
+
+    def rate(self):
+        if len(self.timestamps) < 5:
+            return None
+        span = self.timestamps[-1] - self.timestamps[0]
+        return (len(self.timestamps) - 1) / span if span > 0 else None
 
-    # Rest of the FFmpeg writer initialization remains the same...
-    if writer is None:
+class HlsRecorder:
+    """
+    Stores one device's video in small .ts segments and maintains an .m3u8 playlist.
+    Resolves the device folder and metadata once and owns the FFmpeg process for its lifetime.
+    Frames are handed over through a bounded queue and written by the recorder's own thread,
+    so a slow encoder never stalls the live feed.
+    """
+    mode = "reencode"
+
+    def __init__(self, device_id, device_title, device_location, width, height):
+        self.device_id = device_id
+        self.device_title = device_title
+        self.device_location = device_location
+        self.width = width
+        self.height = height
+        self.writer = None
+        self.lock = threading.Lock()  # Guards the FFmpeg process and folder
+        self.folder_name = resolve_playback_folder(device_id, device_title, device_location)
+
+        self.queue = collections.deque()
+        self.queue_condition = threading.Condition()
+        self.frame_stride = 1  # degrade_fps policy: only every Nth offered frame is queued
+        self.offered_frames = 0
+        self.last_degrade_time = 0.0
+        self.accepted_rate = RateEstimator()
+        self.written_rate = RateEstimator()
+        self.input_rate = None  # -r currently given to FFmpeg
+        self.last_rate_check = 0.0
+        self.retry_at = 0.0  # After FFmpeg fails to start, frames are dropped until then
+        self.counters = {"frames_written": 0, "frames_dropped": 0, "writer_restarts": 0, "writer_start_errors": 0}
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name=f"recorder-{device_id}", daemon=True)
+        self.thread.start()
+
+    def update(self, device_title, device_location):
+        """Apply a title/location change: restart FFmpeg on the renamed folder at the next frame."""
+        if device_title == self.device_title and device_location == self.device_location:
+            return
+        with self.lock:
+            self.stop_writer()  # FFmpeg holds paths inside the old folder
+            self.device_title = device_title
+            self.device_location = device_location
+            try:
+                self.folder_name = apply_playback_metadata(self.folder_name, self.device_id, device_title, device_location)
+            except Exception as e:
+                print(f"Error updating metadata for {self.device_id}: {e}")
+
+    def start_writer(self, input_rate):
+        device_folder_path = os.path.join(playback_path, self.folder_name)
+        segment_filename = os.path.join(device_folder_path, f"{self.device_id}_%03d.ts")
+        playlist_filename = os.path.join(device_folder_path, f"{self.device_id}.m3u8")
         ffmpeg_cmd = [
             ffmpeg_path,
             "-y",
             "-f", "rawvideo",
             "-pix_fmt", "bgr24",
-            "-s", f"{width}x{height}",
-            "-r", "30",
+            "-s", f"{self.width}x{self.height}",
+            "-r", f"{input_rate:.2f}",  # Match the rate frames actually reach the recorder
             "-i", "-",
             "-c:v", "libx264",
             "-preset", "medium",
@@ -513,17 +1269,446 @@ def store_video_recording_ffmpeg(frame, device_id, device_title, device_location
             "-hls_list_size", "0",
             playlist_filename
         ]
-        writer = subprocess.Popen(ffmpeg_cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-    
-    try:
-        writer.stdin.write(frame.tobytes())
-    except Exception as e:
-        print(f"Error writing frame to FFmpeg for {device_id}: {e}")
-        writer.stdin.close()
-        writer.wait()
-        writer = None
-    
-    return writer
+        self.writer = subprocess.Popen(ffmpeg_cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self.input_rate = input_rate
+
+    def stop_writer(self):
+        if self.writer:
+            try:
+                self.writer.stdin.close()
+            except Exception:
+                pass
+            self.writer.wait()
+            self.writer = None
+
+    def record_drop(self, count=1):
+        self.counters["frames_dropped"] += count
+        pipeline_metrics.increment("luka_recording_dropped_frames_total", count, camera=self.device_id)
+
+    def write(self, frame, detections=None, processed_frame=None):
+        """Queue a frame for recording. Never blocks; applies the drop policy when the queue is full."""
+        now = time.time()
+        with self.queue_condition:
+            self.offered_frames += 1
+            if self.offered_frames % self.frame_stride != 0:
+                self.record_drop()  # Skipped by the degraded frame rate
+                return
+
+            if len(self.queue) >= recording_queue_size:
+                self.queue.popleft()
+                self.record_drop()
+                if recording_drop_policy == "degrade_fps":
+                    self.frame_stride = min(self.frame_stride * 2, 8)
+                    self.last_degrade_time = now
+            elif not self.queue and self.frame_stride > 1 and now - self.last_degrade_time > 5:
+                self.frame_stride //= 2  # Encoder has caught up, step the frame rate back up
+                self.last_degrade_time = now
+
+            self.queue.append((now, frame))
+            self.accepted_rate.add(now)
+            self.queue_condition.notify()
+
+    def current_rate(self):
+        rate = self.written_rate.rate() or self.accepted_rate.rate()
+        if rate is None:
+            rate = max_frame_rate / self.frame_stride if max_frame_rate > 0 else 30
+        return max(1.0, rate)
+
+    def rate_drifted(self, now):
+        """True when FFmpeg's input rate is more than 20% off the rate frames are delivered at."""
+        if now - self.last_rate_check < 5:
+            return False
+        self.last_rate_check = now
+        rate = self.written_rate.rate()
+        return rate is not None and abs(rate - self.input_rate) > 0.2 * self.input_rate
+
+    def run(self):
+        while True:
+            with self.queue_condition:
+                while self.running and not self.queue:
+                    self.queue_condition.wait(0.5)
+                if not self.queue:
+                    break  # Closed and drained
+                timestamp, frame = self.queue.popleft()
+
+            self.written_rate.add(timestamp)
+            with self.lock:
+                if self.writer is not None and self.rate_drifted(time.time()):
+                    self.stop_writer()
+                    self.counters["writer_restarts"] += 1
+                if self.writer is None:
+                    if time.time() < self.retry_at:
+                        self.record_drop()
+                        continue
+                    try:
+                        self.start_writer(self.current_rate())
+                    except Exception as e:
+                        print(f"Error starting FFmpeg for {self.device_id}, retrying in 5s: {e}")
+                        self.counters["writer_start_errors"] += 1
+                        self.retry_at = time.time() + 5
+                        self.record_drop()
+                        continue
+                try:
+                    self.writer.stdin.write(np.ascontiguousarray(frame).data)
+                    self.counters["frames_written"] += 1
+                except Exception as e:
+                    print(f"Error writing frame to FFmpeg for {self.device_id}: {e}")
+                    self.stop_writer()
+
+    @contextlib.contextmanager
+    def paused(self):
+        """Hold FFmpeg stopped while the playlist is rewritten; append_list picks it up on restart."""
+        with self.lock:
+            self.stop_writer()
+            yield
+
+    def close(self):
+        with self.queue_condition:
+            self.running = False
+            self.queue_condition.notify_all()
+        self.thread.join(timeout=10)
+        with self.lock:
+            self.stop_writer()
+
+    def stats(self):
+        with self.queue_condition:
+            queue_depth = len(self.queue)
+        return {
+            "device_id": self.device_id,
+            "mode": self.mode,
+            "folder_name": self.folder_name,
+            "queue_depth": queue_depth,
+            "queue_size": recording_queue_size,
+            "drop_policy": recording_drop_policy,
+            "frame_stride": self.frame_stride,
+            "input_rate": self.input_rate,
+            **self.counters
+        }
+
+class PassthroughRecorder:
+    """
+    Stream-copies the camera's own feed (-c copy) into the device's HLS folder, so recording
+    needs no decoding or encoding. Detections are appended to detections.jsonl as timed
+    metadata instead of being burned into the video. The recorder's own thread starts FFmpeg
+    and restarts it when it exits, so the live feed never waits on the process.
+    """
+    mode = "passthrough"
+
+    def __init__(self, device_id, device_title, device_location, stream_url):
+        self.device_id = device_id
+        self.device_title = device_title
+        self.device_location = device_location
+        self.stream_url = stream_url
+        self.process = None
+        self.last_start_time = 0.0
+        self.lock = threading.Lock()  # Guards the FFmpeg process
+        self.detections_lock = threading.Lock()  # Guards detections_file and the folder it lives in
+        self.condition = threading.Condition()
+        self.running = True
+        self.counters = {"process_restarts": 0, "detection_events": 0}
+        self.folder_name = resolve_playback_folder(device_id, device_title, device_location)
+        self.detections_file = self.open_detections_file()
+        self.thread = threading.Thread(target=self.run, name=f"recorder-{device_id}", daemon=True)
+        self.thread.start()
+
+    def open_detections_file(self):
+        return open(os.path.join(playback_path, self.folder_name, "detections.jsonl"), "a", buffering=1)
+
+    def start_process(self):
+        device_folder_path = os.path.join(playback_path, self.folder_name)
+        segment_filename = os.path.join(device_folder_path, f"{self.device_id}_%03d.ts")
+        playlist_filename = os.path.join(device_folder_path, f"{self.device_id}.m3u8")
+        ffmpeg_cmd = [ffmpeg_path, "-y"]
+        if self.stream_url.startswith("rtsp://"):
+            ffmpeg_cmd += ["-rtsp_transport", "tcp"]
+        ffmpeg_cmd += [
+            "-i", get_fresh_stream(self.stream_url),
+            "-map", "0:v:0",
+            "-c:v", "copy",
+            "-an",
+            "-f", "hls",
+            "-hls_time", "5",
+            "-hls_flags", "append_list+program_date_time",  # Wall-clock tags line segments up with detections.jsonl
+            "-hls_segment_filename", segment_filename,
+            "-hls_list_size", "0",
+            playlist_filename
+        ]
+        self.last_start_time = time.time()
+        self.process = subprocess.Popen(ffmpeg_cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def stop_process(self):
+        if self.process:
+            self.process.terminate()  # FFmpeg finalizes the current segment on SIGTERM
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+            self.process = None
+
+    def run(self):
+        """Keep FFmpeg running: start it, and reconnect when the camera drops or FFmpeg exits."""
+        while True:
+            with self.lock:
+                if not self.running:
+                    break
+                if self.process is None or (self.process.poll() is not None and time.time() - self.last_start_time > 5):
+                    if self.process is not None:
+                        self.stop_process()
+                        self.counters["process_restarts"] += 1
+                    try:
+                        self.start_process()
+                    except Exception as e:
+                        print(f"Error starting passthrough recording for {self.device_id}: {e}")
+            with self.condition:
+                if self.running:
+                    self.condition.wait(1.0)
+
+    def update(self, device_title, device_location):
+        """Apply a title/location change; the recorder thread restarts FFmpeg in the renamed folder."""
+        if device_title == self.device_title and device_location == self.device_location:
+            return
+        with self.lock:
+            self.stop_process()  # FFmpeg holds paths inside the old folder
+            with self.detections_lock:
+                self.detections_file.close()
+                self.device_title = device_title
+                self.device_location = device_location
+                try:
+                    self.folder_name = apply_playback_metadata(self.folder_name, self.device_id, device_title, device_location)
+                except Exception as e:
+                    print(f"Error updating metadata for {self.device_id}: {e}")
+                self.detections_file = self.open_detections_file()
+
+    def write(self, frame, detections=None, processed_frame=None):
+        """Frames themselves are not needed; only log detections."""
+        if not detections:
+            return
+        with self.detections_lock:
+            self.detections_file.write(json.dumps({"timestamp": time.time(), "detections": detections}) + "\n")
+            self.counters["detection_events"] += 1
+
+    @contextlib.contextmanager
+    def paused(self):
+        """Hold FFmpeg stopped while the playlist is rewritten; the recorder thread restarts it afterwards."""
+        with self.lock:
+            self.stop_process()
+            yield
+
+    def close(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        self.thread.join(timeout=10)
+        with self.lock:
+            self.stop_process()
+        with self.detections_lock:
+            self.detections_file.close()
+
+    def stats(self):
+        return {
+            "device_id": self.device_id,
+            "mode": self.mode,
+            "folder_name": self.folder_name,
+            "running": self.process is not None and self.process.poll() is None,
+            **self.counters
+        }
+
+class EventClip:
+    """Encodes one event clip from already-encoded JPEG frames on its own thread."""
+    def __init__(self, path, frame_rate):
+        self.path = path
+        self.partial_path = path + ".part"
+        self.frames = queue.Queue()
+        ffmpeg_cmd = [
+            ffmpeg_path,
+            "-y",
+            "-f", "image2pipe",
+            "-c:v", "mjpeg",
+            "-framerate", f"{frame_rate:.2f}",
+            "-i", "-",
+            "-c:v", "libx264",
+            "-preset", "veryfast",
+            "-pix_fmt", "yuv420p",
+            "-movflags", "+faststart",
+            "-f", "mp4",
+            self.partial_path
+        ]
+        self.process = subprocess.Popen(ffmpeg_cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self.thread = threading.Thread(target=self.run, name="event-clip", daemon=True)
+        self.thread.start()
+
+    def add(self, processed_frame):
+        self.frames.put(processed_frame)
+
+    def finish(self):
+        self.frames.put(None)
+
+    def run(self):
+        try:
+            while True:
+                processed_frame = self.frames.get()
+                if processed_frame is None:
+                    break
+                self.process.stdin.write(processed_frame.jpeg())
+        except Exception as e:
+            print(f"Error writing event clip {self.path}: {e}")
+        finally:
+            try:
+                self.process.stdin.close()
+            except Exception:
+                pass
+            if self.process.wait() == 0:
+                os.replace(self.partial_path, self.path)  # Only show complete clips in the record log
+            else:
+                print(f"FFmpeg failed to write event clip {self.path}")
+                try:
+                    os.remove(self.partial_path)
+                except FileNotFoundError:
+                    pass
+
+class EventRecorder:
+    """
+    Keeps the last event_preroll_seconds of a camera's JPEG frames in memory and, when a target
+    object is detected, writes the pre-roll plus event_postroll_seconds after the last detection
+    to an MP4 clip in the records folder. Quiet cameras write nothing.
+    """
+    mode = "event"
+
+    def __init__(self, device_id, device_title, device_location):
+        self.device_id = device_id
+        self.device_title = device_title
+        self.device_location = device_location
+        self.preroll = collections.deque()  # (timestamp, ProcessedFrame)
+        self.frame_rate = RateEstimator()
+        self.clip = None
+        self.clip_start = 0.0
+        self.clip_end = 0.0
+        self.lock = threading.Lock()
+        self.counters = {"clips_written": 0, "clip_frames": 0}
+
+    def update(self, device_title, device_location):
+        self.device_title = device_title
+        self.device_location = device_location
+
+    def write(self, frame, detections=None, processed_frame=None):
+        if processed_frame is None:
+            processed_frame = ProcessedFrame(frame, self.device_id)
+        now = time.time()
+        with self.lock:
+            self.frame_rate.add(now)
+            if self.clip is not None:
+                self.clip.add(processed_frame)
+                self.counters["clip_frames"] += 1
+                if now >= self.clip_end:
+                    self.finish_clip()
+                return
+
+            self.preroll.append((now, processed_frame))
+            while self.preroll and now - self.preroll[0][0] > event_preroll_seconds:
+                self.preroll.popleft()
+
+    def trigger(self, detected_objects):
+        """Start a clip (flushing the pre-roll) or extend the running one."""
+        now = time.time()
+        with self.lock:
+            if self.clip is None:
+                detected_objects_str = "_".join(sorted(detected_objects))
+                timestamp = time.strftime("%m-%d-%y_%I-%M-%S%p")
+                path = os.path.join(
+                    detected_records_path,
+                    f"{timestamp}_{detected_objects_str}_detected_on_{self.device_title}_{self.device_location}.mp4"
+                )
+                self.clip = EventClip(path, self.frame_rate.rate() or max(1, max_frame_rate))
+                self.clip_start = now
+                for _, processed_frame in self.preroll:
+                    self.clip.add(processed_frame)
+                    self.counters["clip_frames"] += 1
+                self.preroll.clear()
+            self.clip_end = min(now + event_postroll_seconds, self.clip_start + event_max_clip_seconds)
+
+    def finish_clip(self):
+        self.clip.finish()
+        self.clip = None
+        self.counters["clips_written"] += 1
+
+    def close(self):
+        with self.lock:
+            if self.clip is not None:
+                self.finish_clip()
+            self.preroll.clear()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "device_id": self.device_id,
+                "mode": self.mode,
+                "recording_clip": self.clip is not None,
+                "preroll_frames": len(self.preroll),
+                **self.counters
+            }
+
+def trigger_event_recording(device_id, detected_objects):
+    with playback_recorders_lock:
+        recorder = playback_recorders.get(device_id)
+    if recorder is not None and recorder.mode == "event":
+        recorder.trigger(detected_objects)
+
+playback_recorders = {}  # device_id -> HlsRecorder, PassthroughRecorder or EventRecorder
+playback_recorders_lock = threading.Lock()
+
+def get_playback_recorder(device_id, device_title, device_location, stream_url):
+    """Return the device's recorder for the current recording_mode, replacing one of another mode."""
+    with playback_recorders_lock:
+        recorder = playback_recorders.get(device_id)
+        if recorder is not None and recorder.mode != recording_mode:
+            playback_recorders.pop(device_id)
+        else:
+            recorder = None
+    if recorder is not None:
+        # Joins its thread and waits for FFmpeg: done outside the lock so other cameras keep recording,
+        # and before the replacement starts so two FFmpeg processes never write the same playlist
+        recorder.close()
+
+    with playback_recorders_lock:
+        recorder = playback_recorders.get(device_id)
+        if recorder is None:
+            if recording_mode == "passthrough":
+                recorder = PassthroughRecorder(device_id, device_title, device_location, stream_url)
+            elif recording_mode == "event":
+                recorder = EventRecorder(device_id, device_title, device_location)
+            else:
+                recorder = HlsRecorder(device_id, device_title, device_location, output_resolution[0], output_resolution[1])
+            playback_recorders[device_id] = recorder
+    recorder.update(device_title, device_location)
+    return recorder
+
+def update_playback_recorder(device_id, device_title, device_location):
+    """Called when a device is renamed or moved so the playback folder follows it."""
+    with playback_recorders_lock:
+        recorder = playback_recorders.get(device_id)
+    if recorder is not None:
+        recorder.update(device_title, device_location)
+        return
+
+    folder_name = find_playback_folder(device_id)
+    if folder_name is not None:
+        try:
+            apply_playback_metadata(folder_name, device_id, device_title, device_location)
+        except Exception as e:
+            print(f"Error updating metadata for {device_id}: {e}")
+
+@app.route('/recording/stats', methods=['GET'])
+def recording_stats():
+    """Queue depth, drops and FFmpeg state for every active recorder."""
+    with playback_recorders_lock:
+        recorders = list(playback_recorders.values())
+    return jsonify([recorder.stats() for recorder in recorders])
+
+def close_playback_recorder(device_id):
+    with playback_recorders_lock:
+        recorder = playback_recorders.pop(device_id, None)
+    if recorder is not None:
+        recorder.close()
 
 @app.route('/playback/<folder_name>/<path:filename>')
 def playback_segment(folder_name, filename):
@@ -534,138 +1719,679 @@ def playback_segment(folder_name, filename):
         response.headers['Cache-Control'] = 'public, max-age=60'
     return response
 
+# SUBSECTION: Playback Index (kept current by the watchdog Observer, shared by /list_videos and /sse)
+class PlaybackIndexHandler(FileSystemEventHandler):
+    """Forwards playlist, metadata and device folder changes under playback_path to the index."""
+    def __init__(self, index):
+        self.index = index
+
+    def on_any_event(self, event):
+        for path in (event.src_path, getattr(event, "dest_path", None)):
+            if path:
+                self.index.handle_path(os.fsdecode(path), event.is_directory)
+
+class PlaybackIndex:
+    """
+    In-memory list of recorded devices. The folders are scanned once at start; afterwards only the
+    folder named by a filesystem event is re-read, and subscribers are woken when the list or a
+    device's title/location changes. Segment writes alone only refresh last_modified.
+    """
+    def __init__(self):
+        self.videos = {}  # folder_name -> video info as returned by /list_videos
+        self.metadata = {}  # folder_name -> (metadata.json mtime, metadata)
+        self.version = 0
+        self.condition = threading.Condition()
+        self.root = None
+        self.observer = None
+        self.start_lock = threading.Lock()
+
+    def ensure_started(self):
+        with self.start_lock:
+            if self.observer is not None:
+                return
+            os.makedirs(playback_path, exist_ok=True)
+            self.root = os.path.abspath(playback_path)
+            self.observer = Observer()
+            self.observer.schedule(PlaybackIndexHandler(self), path=self.root, recursive=True)
+            self.observer.daemon = True
+            self.observer.start()  # Before the scan, so nothing created in between is missed
+            for folder_name in os.listdir(self.root):
+                self.refresh_folder(folder_name)
+
+    def handle_path(self, path, is_directory):
+        relative_path = os.path.relpath(os.path.abspath(path), self.root)
+        parts = relative_path.split(os.sep)
+        if parts[0] in (os.curdir, os.pardir):
+            return
+        if len(parts) == 1 or (not is_directory and (parts[-1] == "metadata.json" or parts[-1].endswith(".m3u8"))):
+            self.refresh_folder(parts[0])
+
+    def read_metadata(self, folder_name, folder_path):
+        metadata_path = os.path.join(folder_path, "metadata.json")
+        try:
+            mtime = os.path.getmtime(metadata_path)
+        except OSError:
+            self.metadata.pop(folder_name, None)
+            return {}
+        cached = self.metadata.get(folder_name)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        try:
+            with open(metadata_path, 'r') as f:
+                metadata = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return cached[1] if cached else {}  # Caught mid-write, the next event re-reads it
+        self.metadata[folder_name] = (mtime, metadata)
+        return metadata
+
+    def refresh_folder(self, folder_name):
+        folder_path = os.path.join(self.root, folder_name)
+        device_id = folder_name.split('_')[0]
+        m3u8_path = os.path.join(folder_path, f"{device_id}.m3u8")
+        try:
+            last_modified = os.path.getmtime(m3u8_path)
+        except OSError:
+            last_modified = None
+
+        with self.condition:
+            previous = self.videos.get(folder_name)
+            if last_modified is None:
+                self.metadata.pop(folder_name, None)
+                if previous is not None:
+                    del self.videos[folder_name]
+                    self.publish()
+                return
+
+            video_info = {
+                'folder_name': folder_name,
+                'device_id': device_id,
+                'url': f'/playback/{folder_name}/{device_id}.m3u8',
+                'last_modified': last_modified
+            }
+            metadata = self.read_metadata(folder_name, folder_path)
+            if metadata:
+                video_info.update({
+                    'title': metadata.get('device_title', ''),
+                    'location': metadata.get('device_location', '')
+                })
+            self.videos[folder_name] = video_info
+            if previous is None or previous.get('title') != video_info.get('title') \
+                    or previous.get('location') != video_info.get('location'):
+                self.publish()
+
+    def publish(self):
+        self.version += 1
+        self.condition.notify_all()
+
+    def list(self):
+        self.ensure_started()
+        with self.condition:
+            return list(self.videos.values())
+
+    def wait_for_change(self, last_version, timeout):
+        """Returns (version, folder names) once the index differs from last_version, or None on timeout."""
+        self.ensure_started()
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.version != last_version, timeout):
+                return None
+            return self.version, list(self.videos)
+
+playback_index = PlaybackIndex()
+
 @app.route('/list_videos')
 def list_videos():
     """Returns a list of available video streams with metadata."""
-    videos = []
-    for folder_name in os.listdir(playback_path):
-        folder_path = os.path.join(playback_path, folder_name)
-        if os.path.isdir(folder_path):
-            m3u8_path = os.path.join(folder_path, f"{folder_name.split('_')[0]}.m3u8")
-            metadata_path = os.path.join(folder_path, "metadata.json")
-            
-            if os.path.exists(m3u8_path):
-                video_info = {
-                    'folder_name': folder_name,
-                    'device_id': folder_name.split('_')[0],
-                    'url': f'/playback/{folder_name}/{folder_name.split("_")[0]}.m3u8',
-                    'last_modified': os.path.getmtime(m3u8_path)
-                }
-                
-                if os.path.exists(metadata_path):
-                    with open(metadata_path, 'r') as f:
-                        try:
-                            metadata = json.load(f)
-                            video_info.update({
-                                'title': metadata.get('device_title', ''),
-                                'location': metadata.get('device_location', '')
-                            })
-                        except json.JSONDecodeError:
-                            pass
-                
-                videos.append(video_info)
-    return json.dumps(videos)
+    return json.dumps(playback_index.list())
 
 @app.route('/sse')
 def sse():
-    """Improved SSE endpoint with version tracking."""
+    """Pushes the device list whenever the playback index changes."""
     def generate_sse():
-        last_version = 0
+        last_version = None
         while True:
-            current_videos = []
-            version = 0
-            for folder_name in os.listdir(playback_path):
-                folder_path = os.path.join(playback_path, folder_name)
-                if os.path.isdir(folder_path):
-                    m3u8_path = os.path.join(folder_path, f"{folder_name.split('_')[0]}.m3u8")
-                    if os.path.exists(m3u8_path):
-                        current_videos.append(folder_name)
-                        version += int(os.path.getmtime(m3u8_path))
-            
-            if version != last_version:
-                last_version = version
-                yield f"data: {json.dumps({'version': version, 'devices': current_videos})}\n\n"
-            time.sleep(2)
+            change = playback_index.wait_for_change(last_version, timeout=15)
+            if change is None:
+                yield ": keepalive\n\n"  # Lets the server notice closed dashboards
+                continue
+            last_version, devices = change
+            yield f"data: {json.dumps({'version': last_version, 'devices': devices})}\n\n"
 
     return Response(generate_sse(), mimetype='text/event-stream')
 
+# SECTION: Playback Retention and Segment Compaction
+HOURLY_SEGMENT_PATTERN = re.compile(r"^\d+_\d{8}_\d{2}(_\d+)?\.ts$")
+
+class PlaylistEntry:
+    """One media segment of an HLS playlist with the tags written before it."""
+    def __init__(self, uri, tags):
+        self.uri = uri
+        self.tags = tags
+
+    @property
+    def duration(self):
+        for tag in self.tags:
+            if tag.startswith("#EXTINF:"):
+                try:
+                    return float(tag[len("#EXTINF:"):].split(",")[0])
+                except ValueError:
+                    return 0.0
+        return 0.0
+
+    def has_tag(self, name):
+        return any(tag.startswith(name) for tag in self.tags)
+
+def parse_playlist(playlist_path):
+    """Returns (media_sequence, entries, has_endlist) for an FFmpeg-written HLS playlist."""
+    media_sequence = 0
+    entries = []
+    tags = []
+    has_endlist = False
+    with open(playlist_path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line == "#EXTM3U":
+                continue
+            if line.startswith("#EXT-X-MEDIA-SEQUENCE:"):
+                media_sequence = int(line.split(":", 1)[1])
+            elif line == "#EXT-X-ENDLIST":
+                has_endlist = True
+            elif line.startswith(("#EXT-X-VERSION", "#EXT-X-TARGETDURATION")):
+                continue  # Recomputed when the playlist is written
+            elif line.startswith("#"):
+                tags.append(line)
+            else:
+                entries.append(PlaylistEntry(line, tags))
+                tags = []
+    return media_sequence, entries, has_endlist
+
+def write_playlist(playlist_path, media_sequence, entries, has_endlist):
+    """Write the playlist to a temporary file and swap it in, so players never read half a file."""
+    target_duration = max([math.ceil(entry.duration) for entry in entries] + [1])
+    lines = ["#EXTM3U", "#EXT-X-VERSION:3", f"#EXT-X-TARGETDURATION:{target_duration}", f"#EXT-X-MEDIA-SEQUENCE:{media_sequence}"]
+    for entry in entries:
+        lines.extend(entry.tags)
+        lines.append(entry.uri)
+    if has_endlist:
+        lines.append("#EXT-X-ENDLIST")
+    temporary_path = playlist_path + ".tmp"
+    with open(temporary_path, 'w') as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(temporary_path, playlist_path)
+
+def retention_quota(device_id):
+    """(max_age_seconds, max_bytes) for a camera, applying any per-camera override."""
+    quota = retention_quotas.get(str(device_id), {})
+    max_age_hours = quota.get("max_age_hours", retention_max_age_hours)
+    max_gb = quota.get("max_gb", retention_max_gb)
+    return max_age_hours * 3600, max_gb * 1024 ** 3
+
+class PlaybackRetention:
+    """
+    Background service that keeps each camera's playback folder within its age and size quota.
+    Old segments are stream-copied into one .ts file per hour, expired ones are deleted and the
+    playlist is rewritten to match. Each folder's playlist is parsed only when it changed and
+    each segment is stat'ed once, so a pass costs the same however much footage is stored.
+    """
+    def __init__(self):
+        self.folders = {}  # folder_name -> {"playlist_mtime", "media_sequence", "entries", "segments"}
+        self.lock = threading.Lock()
+        self.last_run = None
+        self.counters = {"passes": 0, "segments_deleted": 0, "segments_compacted": 0, "bytes_deleted": 0, "errors": 0}
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="playback-retention", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            time.sleep(max(10, retention_interval))
+            if retention_enabled:
+                self.run_once()
+
+    def run_once(self):
+        if not os.path.isdir(playback_path):
+            return
+        folder_names = [name for name in os.listdir(playback_path) if os.path.isdir(os.path.join(playback_path, name))]
+        with self.lock:
+            for folder_name in list(self.folders):
+                if folder_name not in folder_names:
+                    del self.folders[folder_name]  # Renamed or deleted
+        for folder_name in folder_names:
+            try:
+                self.process_folder(folder_name)
+            except Exception as e:
+                self.counters["errors"] += 1
+                print(f"Retention error in {folder_name}: {e}")
+        self.counters["passes"] += 1
+        self.last_run = time.time()
+
+    def refresh_folder(self, folder_name, playlist_path):
+        """Re-parse the playlist if FFmpeg touched it and stat only segments not seen before."""
+        with self.lock:
+            state = self.folders.setdefault(folder_name, {"playlist_mtime": None, "media_sequence": 0, "entries": [], "segments": {}})
+        playlist_mtime = os.path.getmtime(playlist_path)
+        if playlist_mtime != state["playlist_mtime"]:
+            state["media_sequence"], state["entries"], _ = parse_playlist(playlist_path)
+            state["playlist_mtime"] = playlist_mtime
+
+        segments = {}
+        for entry in state["entries"]:
+            info = state["segments"].get(entry.uri)
+            if info is None:
+                try:
+                    stat = os.stat(os.path.join(playback_path, folder_name, entry.uri))
+                except OSError:
+                    continue  # Listed but missing, leave it to FFmpeg
+                info = (stat.st_size, stat.st_mtime)
+            segments[entry.uri] = info
+        state["segments"] = segments
+        return state
+
+    def process_folder(self, folder_name):
+        device_id = folder_name.split('_')[0]
+        folder_path = os.path.join(playback_path, folder_name)
+        playlist_path = os.path.join(folder_path, f"{device_id}.m3u8")
+        if not os.path.exists(playlist_path):
+            return
+        state = self.refresh_folder(folder_name, playlist_path)
+        entries = [entry for entry in state["entries"] if entry.uri in state["segments"]]
+        if not entries:
+            return
+
+        # Expired by age, then oldest first until the folder fits its size quota
+        now = time.time()
+        max_age, max_bytes = retention_quota(device_id)
+        segments = state["segments"]
+        removed = {entry.uri for entry in entries if now - segments[entry.uri][1] > max_age}
+        total_bytes = sum(size for uri, (size, _) in segments.items() if uri not in removed)
+        for entry in entries:
+            if total_bytes <= max_bytes:
+                break
+            if entry.uri not in removed:
+                removed.add(entry.uri)
+                total_bytes -= segments[entry.uri][0]
+
+        compacted = self.compact(folder_path, device_id, [entry for entry in entries if entry.uri not in removed], segments, now)
+        if not removed and not compacted:
+            return
+        self.apply(folder_name, folder_path, playlist_path, device_id, removed, compacted)
+
+    def compact(self, folder_path, device_id, entries, segments, now):
+        """
+        Stream-copy runs of finished segments from the same past hour into one file.
+        Returns [(hourly_entry, source_uris)] for the groups that were written.
+        """
+        current_hour = time.strftime("%Y%m%d_%H", time.localtime(now))
+        groups = []
+        for entry in entries:
+            mtime = segments[entry.uri][1]
+            hour = time.strftime("%Y%m%d_%H", time.localtime(mtime))
+            if HOURLY_SEGMENT_PATTERN.match(entry.uri) or hour == current_hour or now - mtime < compaction_after_hours * 3600:
+                groups.append(None)  # Breaks a run; only consecutive segments are merged
+                continue
+            if groups and groups[-1] is not None and groups[-1][0] == hour:
+                groups[-1][1].append(entry)
+            else:
+                groups.append((hour, [entry]))
+
+        compacted = []
+        for group in groups:
+            if group is None or len(group[1]) < 2:
+                continue
+            hour, group_entries = group
+            hourly_uri = f"{device_id}_{hour}.ts"
+            suffix = 1
+            while os.path.exists(os.path.join(folder_path, hourly_uri)):
+                hourly_uri = f"{device_id}_{hour}_{suffix}.ts"
+                suffix += 1
+            if not self.concat_segments(folder_path, [entry.uri for entry in group_entries], hourly_uri):
+                continue
+            last_mtime = segments[group_entries[-1].uri][1]
+            os.utime(os.path.join(folder_path, hourly_uri), (last_mtime, last_mtime))  # Age it by its footage
+            # The merged file restarts its timestamps, so mark it as a discontinuity
+            tags = ["#EXT-X-DISCONTINUITY"]
+            tags += [tag for tag in group_entries[0].tags if tag.startswith("#EXT-X-PROGRAM-DATE-TIME")]
+            tags.append(f"#EXTINF:{sum(entry.duration for entry in group_entries):.6f},")
+            compacted.append((PlaylistEntry(hourly_uri, tags), [entry.uri for entry in group_entries]))
+        return compacted
+
+    def concat_segments(self, folder_path, uris, output_uri):
+        list_path = os.path.join(folder_path, f"{output_uri}.txt")
+        partial_path = os.path.join(folder_path, f"{output_uri}.part")
+        with open(list_path, 'w') as f:
+            for uri in uris:
+                f.write(f"file '{uri}'\n")
+        try:
+            result = subprocess.run(
+                [ffmpeg_path, "-y", "-f", "concat", "-safe", "0", "-i", list_path, "-c", "copy", "-f", "mpegts", partial_path],
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            )
+            if result.returncode != 0:
+                print(f"FFmpeg could not compact {len(uris)} segments into {output_uri}")
+                self.counters["errors"] += 1
+                if os.path.exists(partial_path):
+                    os.remove(partial_path)
+                return False
+            os.replace(partial_path, os.path.join(folder_path, output_uri))
+            return True
+        finally:
+            os.remove(list_path)
+
+    def apply(self, folder_name, folder_path, playlist_path, device_id, removed, compacted):
+        """Rewrite the playlist with FFmpeg stopped, then delete the files it no longer lists."""
+        with playback_recorders_lock:
+            recorder = playback_recorders.get(device_id)
+        pause = recorder.paused() if recorder is not None and hasattr(recorder, "paused") else contextlib.nullcontext()
+
+        replaced = {}  # first source uri -> (hourly_entry, source_uris)
+        for hourly_entry, source_uris in compacted:
+            replaced[source_uris[0]] = (hourly_entry, source_uris)
+        hourly_uris = {hourly_entry.uri for hourly_entry, _ in compacted}
+        unused_outputs = set(hourly_uris)
+        obsolete = set()
+
+        with pause:
+            # FFmpeg may have added segments (and rewritten the list) since the plan was made
+            media_sequence, entries, has_endlist = parse_playlist(playlist_path)
+            listed = [entry.uri for entry in entries]
+            new_entries = []
+            skip = set()
+            for index, entry in enumerate(entries):
+                if entry.uri in skip:
+                    continue
+                if entry.uri in removed:
+                    obsolete.add(entry.uri)
+                    continue
+                if entry.uri in replaced:
+                    hourly_entry, source_uris = replaced[entry.uri]
+                    if listed[index:index + len(source_uris)] == source_uris:
+                        new_entries.append(hourly_entry)
+                        unused_outputs.discard(hourly_entry.uri)
+                        skip.update(source_uris[1:])
+                        obsolete.update(source_uris)
+                        continue
+                if new_entries and new_entries[-1].uri in hourly_uris and not entry.has_tag("#EXT-X-DISCONTINUITY"):
+                    entry = PlaylistEntry(entry.uri, ["#EXT-X-DISCONTINUITY"] + entry.tags)
+                new_entries.append(entry)
+
+            # Keep FFmpeg's segment numbering where it was so new segments never reuse a listed name
+            media_sequence += len(entries) - len(new_entries)
+            write_playlist(playlist_path, media_sequence, new_entries, has_endlist)
+
+        for uri in obsolete | unused_outputs:
+            path = os.path.join(folder_path, uri)
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+            except OSError:
+                continue
+            if uri in removed or uri in unused_outputs:
+                self.counters["bytes_deleted"] += size
+        self.counters["segments_deleted"] += len(removed & obsolete)
+        self.counters["segments_compacted"] += len(obsolete - removed)
+
+        with self.lock:
+            self.folders.pop(folder_name, None)  # Re-read on the next pass
+
+    def stats(self):
+        with self.lock:
+            folders = {
+                folder_name: {
+                    "segments": len(state["segments"]),
+                    "bytes": sum(size for size, _ in state["segments"].values()),
+                    "duration_seconds": sum(entry.duration for entry in state["entries"])
+                }
+                for folder_name, state in self.folders.items()
+            }
+        return {"enabled": retention_enabled, "last_run": self.last_run, "folders": folders, **self.counters}
+
+playback_retention = PlaybackRetention()
+
+@app.route('/retention/stats', methods=['GET'])
+def retention_stats():
+    """Stored footage per camera and what the retention service has deleted or merged."""
+    return jsonify(playback_retention.stats())
+
+# SECTION: Shared Capture Sessions (one producer per camera, fan-out to viewers)
+class CaptureSession:
+    """Decodes and processes one camera once and broadcasts the frames to every viewer."""
+    def __init__(self, stream_url, device_title, device_location, device_id):
+        self.stream_url = stream_url
+        self.device_title = device_title
+        self.device_location = device_location
+        self.device_id = device_id
+        self.frames = collections.deque(maxlen=frame_buffer_size)  # Ring buffer of (sequence, ProcessedFrame)
+        self.sequence = 0
+        self.condition = threading.Condition()
+        self.subscribers = 0
+        self.last_client_time = time.time()
+        self.running = True
+        self.counters = {"frames_grabbed": 0, "frames_dropped": 0}
+        self.motion_gate = MotionGate(device_id)
+        self.thread = threading.Thread(target=self.run, name=f"capture-{device_id}", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+
+    def subscribe(self):
+        with self.condition:
+            self.subscribers += 1
+            self.last_client_time = time.time()
+
+    def unsubscribe(self):
+        with self.condition:
+            self.subscribers -= 1
+            self.last_client_time = time.time()
+
+    def publish(self, processed_frame):
+        with self.condition:
+            self.sequence += 1
+            self.frames.append((self.sequence, processed_frame))
+            self.condition.notify_all()
+
+    def wait_for_frame(self, last_sequence, timeout=1.0):
+        """Return the newest (sequence, frame) after last_sequence, or None on timeout/stop."""
+        with self.condition:
+            if self.sequence <= last_sequence and self.running:
+                self.condition.wait(timeout)
+            if self.frames and self.sequence > last_sequence:
+                return self.frames[-1]  # Slow viewers skip straight to the newest frame
+            return None
+
+    def is_idle(self):
+        with self.condition:
+            return self.subscribers <= 0 and time.time() - self.last_client_time > session_idle_timeout
+
+    def stats(self):
+        return {
+            "device_id": self.device_id,
+            "device_title": self.device_title,
+            "device_location": self.device_location,
+            "subscribers": self.subscribers,
+            "frames_published": self.sequence,
+            "motion_gate": self.motion_gate.stats(),
+            **self.counters
+        }
+
+    def run(self):
+        try:
+            for processed_frame in process_stream(self):
+                self.publish(processed_frame)
+        except Exception as e:
+            print(f"Capture session for {self.device_title} stopped with error: {e}")
+        finally:
+            self.stop()
+            with capture_sessions_lock:
+                if capture_sessions.get(self.device_id) is self:
+                    capture_sessions.pop(self.device_id, None)
+
+def get_capture_session(stream_url, device_title, device_location, device_id):
+    """
+    Return the running session for device_id, starting a new one if needed. stream_url is the camera's
+    configured URL; YouTube links are resolved inside the session, so it stays stable across viewers.
+    """
+    with capture_sessions_lock:
+        capture_session = capture_sessions.get(device_id)
+        if capture_session is not None and capture_session.running and capture_session.stream_url == stream_url:
+            capture_session.device_title = device_title
+            capture_session.device_location = device_location
+            return capture_session
+        if capture_session is not None:
+            capture_session.stop()  # Stream URL changed, replace the old producer
+
+        capture_session = CaptureSession(stream_url, device_title, device_location, device_id)
+        capture_sessions[device_id] = capture_session
+        capture_session.start()
+        return capture_session
+
+@app.route('/stream/stats', methods=['GET'])
+def stream_stats():
+    """Per-camera capture session counters."""
+    with capture_sessions_lock:
+        sessions = list(capture_sessions.values())
+    return jsonify({"capture_mode": capture_mode, "sessions": [capture_session.stats() for capture_session in sessions]})
+
+def stop_capture_session(device_id):
+    device_id = str(device_id)
+    with capture_sessions_lock:
+        capture_session = capture_sessions.pop(device_id, None)
+    if capture_session:
+        capture_session.stop()
+
 # SECTION: Main Streaming Function
-def generate_frames(stream_url, device_title, device_location, device_id):
-    global stream_resolution, active_streams  
+def render_frame(frame, frame_start_time, stream_url, device_title, device_location, device_id, metrics, motion_gate=None, stage_times=None,
+                 detections=None):
+    """Resize, detect and overlay one captured frame. Shared by the live producer loop and the benchmark."""
+    if stage_times is None:
+        stage_times = {}
+
+    # Apply pixelation effect based on stream_resolution
+    resize_start = time.time()
+    if stream_resolution in resolutions:
+        # Step 1: Downscale to target resolution
+        width, height = resolutions[stream_resolution]
+        small_frame = cv2.resize(frame, (width, height), 
+                                interpolation=cv2.INTER_NEAREST)
+        
+        # Step 2: Upscale back to output resolution
+        frame = cv2.resize(small_frame, output_resolution, 
+                          interpolation=cv2.INTER_NEAREST)
+        source_frame = small_frame  # Model sees the same detail as the viewer, without the upscale
+    else:
+        # Default to output resolution if invalid setting
+        source_frame = frame
+        frame = cv2.resize(frame, output_resolution)
+    stage_times["resize"] = time.time() - resize_start
+
+    # Now only one model is used for all streams
+    frame, processing_time, model_status_text = process_frame(frame, stream_url, device_title, device_location, device_id,
+                                                              source_frame, motion_gate, stage_times, detections)
+    update_metrics(metrics, frame_start_time, processing_time, active_streams)
+    overlay_start = time.time()
+    frame = overlay_metrics(frame, metrics, model_status_text)
+    stage_times["drawing"] = stage_times.get("drawing", 0) + time.time() - overlay_start
+    return frame
+
+def process_stream(capture_session):
+    """Producer loop: read and process frames for one camera until stopped or idle."""
+    global stream_resolution, active_streams
 
-    active_streams_dict[device_id] = True  
-    cap = initialize_stream(get_fresh_stream(stream_url), device_title)
+    stream_url = capture_session.stream_url
+    device_id = capture_session.device_id
+
+    cap = open_capture(stream_url, capture_session.device_title, device_id, capture_session.counters)
     if cap is None:
         return
     
-    setup_stream_resolution(cap)
     metrics = initialize_metrics()
     frame_count = 0
     active_streams += 1  
 
-    writer = None  # Initially, no writer (FFmpeg)
-    recording_start = time.time()
+    recorder = None  # Created once playback recording is on
+    processed_frame = None
     
     try:
-        while active_streams_dict.get(device_id, False):  
+        while capture_session.running:  
+            if capture_session.is_idle():
+                print(f"No viewers left for {session.device_title}, closing capture session.")
+                break
+
             frame_start_time = time.time()  
 
             success, frame = cap.read()
+            stage_times = {"capture_read": time.time() - frame_start_time}
             if not success:
+                pipeline_metrics.increment("luka_reconnects_total", camera=device_id)
                 cap.release()
-                cap = initialize_stream(get_fresh_stream(stream_url), device_title)
+                cap = open_capture(stream_url, capture_session.device_title, device_id, capture_session.counters)
                 if cap is None:
                     print("Failed to reconnect. Stopping stream.")
                     break  
-                setup_stream_resolution(cap)
                 continue  
 
             frame_count += 1
             if stream_frame_skip > 0 and frame_count % stream_frame_skip != 0:
                 continue  
 
-            # Apply pixelation effect based on stream_resolution
-            if stream_resolution in resolutions:
-                # Step 1: Downscale to target resolution
-                width, height = resolutions[stream_resolution]
-                small_frame = cv2.resize(frame, (width, height), 
-                                        interpolation=cv2.INTER_NEAREST)
-                
-                # Step 2: Upscale back to output resolution
-                frame = cv2.resize(small_frame, output_resolution, 
-                                  interpolation=cv2.INTER_NEAREST)
-            else:
-                # Default to output resolution if invalid setting
-                frame = cv2.resize(frame, output_resolution)
-
-            # Now only one model is used for all streams
-            frame, processing_time, model_status_text = process_frame(frame, stream_url, device_title, device_location, device_id)
-            update_metrics(metrics, frame_start_time, processing_time, active_streams)
-            frame = overlay_metrics(frame, metrics, model_status_text)
-            encoded_frame = encode_frame(frame)
+            detections = []
+            frame = render_frame(frame, frame_start_time, stream_url, capture_session.device_title, capture_session.device_location, device_id,
+                                 metrics, capture_session.motion_gate, stage_times, detections)
 
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + encoded_frame + b'\r\n')
+            if processed_frame is not None:
+                processed_frame.wait()  # One encode in flight per camera, so a backed-up pool slows the producer down
+            processed_frame = ProcessedFrame(frame, device_id)
+            yield processed_frame  # Encoding runs on the pool while we move on to the next frame
 
+            sleep_start = time.time()
             enforce_frame_rate(frame_start_time)
+            stage_times["frame_rate_sleep"] = time.time() - sleep_start
 
             if playback_recording:
+                hls_start = time.time()
                 try:
-                    writer = store_video_recording_ffmpeg(frame, device_id, device_title, device_location, writer, 
-                                                        output_resolution[0], output_resolution[1])
+                    recorder = get_playback_recorder(device_id, capture_session.device_title, capture_session.device_location, stream_url)
+                    recorder.write(frame, detections, processed_frame)
                 except Exception as e:
                     print(f"Error storing video recording for {device_id}: {e}")
+                stage_times["hls_write"] = time.time() - hls_start
+            elif recorder is not None:
+                close_playback_recorder(device_id)  # Recording switched off
+                recorder = None
+
+            pipeline_metrics.observe_stages(device_id, stage_times)
 
     finally:
         active_streams -= 1  
-        cap.release()
-        cv2.destroyAllWindows()
-        active_streams_dict.pop(device_id, None)
+        if cap is not None:
+            cap.release()
 
-        if writer:
-            writer.stdin.close()
-            writer.wait()
-            writer = None
+        if recorder is not None:
+            close_playback_recorder(device_id)
+
+def generate_frames(stream_url, device_title, device_location, device_id):
+    """Subscriber loop: stream the shared session's frames to one HTTP client."""
+    capture_session = get_capture_session(stream_url, device_title, device_location, str(device_id))
+    capture_session.subscribe()
+    last_sequence = 0
+
+    try:
+        while capture_session.running:
+            item = capture_session.wait_for_frame(last_sequence)
+            if item is None:
+                continue
+            last_sequence, processed_frame = item
+            encoded_frame = processed_frame.jpeg()  # Encoded once, reused by every viewer
+
+            yield (b'--frame\r\n'
+                   b'Content-Type: image/jpeg\r\n\r\n' + encoded_frame + b'\r\n')
+    finally:
+        capture_session.unsubscribe()
 
 # Flask Route for Video Streaming with Device Metadata
 @app.route('/stream')
@@ -678,11 +2404,7 @@ def stream():
     if not stream_url:
         return send_file("img/no-feed-img.png", mimetype='image/png')
 
-    if "youtube.com" in stream_url or "youtu.be" in stream_url:
-        stream_url = get_youtube_stream_url(stream_url)
-        if not stream_url:
-            return send_file("img/no-feed-img.png", mimetype='image/png')
-
+    # YouTube links are resolved by the capture session (open_capture), so every viewer shares one session
     if not (stream_url.startswith("rtsp://") or stream_url.startswith("http://") or stream_url.startswith("https://")):
         return send_file("img/no-feed-img.png", mimetype='image/png')
 
@@ -704,16 +2426,288 @@ def serve_static(filename):
     return send_from_directory("html", filename)
 
 # SECTION: Database Connection Management
+class Database:
+    """
+    Shared SQLite access for one database file: WAL journal and tuned pragmas, a pool of reusable
+    read connections, and a single writer thread that commits whatever writes are queued as one
+    transaction. Callers of submit() never wait for disk; the returned Future resolves after commit.
+    """
+    def __init__(self, path, pool_size=8, max_batch=1000, commit_interval=0.0):
+        self.path = path
+        self.max_batch = max_batch
+        self.commit_interval = commit_interval  # Extra time to gather writes before committing
+        self.readers = queue.LifoQueue(maxsize=pool_size)
+        self.writes = queue.Queue()
+        self.writer_thread = None
+        self.writer_lock = threading.Lock()
+        self.counters = {"writes": 0, "write_errors": 0, "commits": 0}
+
+    def connect(self, autocommit=False):
+        connection = sqlite3.connect(self.path, timeout=10, check_same_thread=False,
+                                     isolation_level=None if autocommit else "")
+        connection.row_factory = sqlite3.Row
+        connection.execute("PRAGMA journal_mode=WAL")  # Readers no longer block the writer (or each other)
+        connection.execute("PRAGMA synchronous=NORMAL")  # fsync at checkpoints only; safe with WAL
+        connection.execute("PRAGMA temp_store=MEMORY")
+        connection.execute("PRAGMA cache_size=-16000")  # 16 MB page cache
+        connection.execute("PRAGMA mmap_size=134217728")
+        return connection
+
+    def acquire(self):
+        try:
+            return self.readers.get_nowait()
+        except queue.Empty:
+            return self.connect()
+
+    def release(self, connection):
+        if connection.in_transaction:
+            connection.rollback()  # Never hand out a connection holding a read snapshot or locks
+        try:
+            self.readers.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    @contextlib.contextmanager
+    def reader(self):
+        connection = self.acquire()
+        try:
+            yield connection
+        finally:
+            self.release(connection)
+
+    def submit(self, work, table=None):
+        """Queue work(connection) for the writer thread. Returns a Future with work's return value."""
+        with self.writer_lock:
+            if self.writer_thread is None:
+                self.writer_thread = threading.Thread(target=self.run_writer, name=f"db-writer-{os.path.basename(self.path)}", daemon=True)
+                self.writer_thread.start()
+        future = Future()
+        self.writes.put((work, future, table, time.time()))
+        return future
+
+    def run_writer(self):
+        connection = self.connect(autocommit=True)
+        while True:
+            batch = [self.writes.get()]
+            deadline = time.time() + self.commit_interval
+            while len(batch) < self.max_batch:  # Everything that queued up during the last commit
+                try:
+                    batch.append(self.writes.get(timeout=max(0.0, deadline - time.time())))
+                except queue.Empty:
+                    break
+
+            try:
+                results = []
+                connection.execute("BEGIN")
+                for work, future, table, queued_at in batch:
+                    connection.execute("SAVEPOINT job")
+                    try:
+                        results.append((future, table, queued_at, work(connection), None))
+                        connection.execute("RELEASE job")
+                    except Exception as e:
+                        connection.execute("ROLLBACK TO job")  # Only this write is lost, not the batch
+                        connection.execute("RELEASE job")
+                        results.append((future, table, queued_at, None, e))
+                try:
+                    connection.execute("COMMIT")
+                    self.counters["commits"] += 1
+                except Exception as e:
+                    connection.execute("ROLLBACK")
+                    results = [(future, table, queued_at, None, e) for future, table, queued_at, _, _ in results]
+
+                now = time.time()
+                for future, table, queued_at, result, error in results:
+                    if table:
+                        pipeline_metrics.observe("luka_db_write_duration_seconds", now - queued_at, table=table)
+                    if error is None:
+                        self.counters["writes"] += 1
+                        future.set_result(result)
+                    else:
+                        self.counters["write_errors"] += 1
+                        print(f"Database write to {self.path} failed: {error}")
+                        future.set_exception(error)
+            except Exception as e:
+                # e.g. disk full or a locked database on BEGIN/ROLLBACK: fail this batch, keep the writer alive
+                print(f"Database writer for {self.path} failed a batch: {e}")
+                try:
+                    if connection.in_transaction:
+                        connection.execute("ROLLBACK")
+                except sqlite3.Error:
+                    pass
+                for work, future, table, queued_at in batch:
+                    if not future.done():
+                        self.counters["write_errors"] += 1
+                        future.set_exception(e)
+                time.sleep(0.1)
+
+    def stats(self):
+        return {"path": self.path, "queued_writes": self.writes.qsize(), "idle_readers": self.readers.qsize(), **self.counters}
+
+alert_database = Database(DB_PATH)
+
 def get_db(): # Database helper function
     if 'db' not in g:
-        g.db = sqlite3.connect(DB_PATH)
-        g.db.row_factory = sqlite3.Row
+        g.db = alert_database.acquire()
     return g.db
 
 @app.teardown_appcontext
 def close_db(error):
     if 'db' in g:
-        g.db.close()
+        alert_database.release(g.pop('db'))
+
+# SUBSECTION: Alert Table Migration and Paged Queries
+ALERT_TIME_FORMAT = "%m-%d-%y_%I-%M-%S%p"
+alert_page_size = 200  # Default page size of /get_alerts
+alert_max_page_size = 5000  # Largest limit a client may ask for
+
+def alert_epoch(detected_at):
+    """Epoch seconds for a detected_at string, or 0 if it is in neither known format."""
+    for time_format in (ALERT_TIME_FORMAT, "%Y-%m-%d %H:%M:%S"):
+        try:
+            return int(datetime.strptime(detected_at, time_format).timestamp())
+        except (TypeError, ValueError):
+            continue
+    return 0
+
+ROLLUP_BUCKETS = ("hour", "day", "month")
+ALERT_ROLLUP_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS alert_rollup (
+        bucket TEXT NOT NULL,
+        bucket_start INTEGER NOT NULL,
+        event_type TEXT NOT NULL,
+        location TEXT NOT NULL,
+        camera_id INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (bucket, bucket_start, event_type, location, camera_id)
+    ) WITHOUT ROWID
+"""
+
+def rollup_bucket_starts(epoch):
+    """Local-time start of the hour, day and month containing epoch, as epoch seconds."""
+    moment = datetime.fromtimestamp(epoch)
+    hour = moment.replace(minute=0, second=0, microsecond=0)
+    day = hour.replace(hour=0)
+    month = day.replace(day=1)
+    return {"hour": int(hour.timestamp()), "day": int(day.timestamp()), "month": int(month.timestamp())}
+
+def rollup_rows(epoch, event_type, location, camera_id, count=1):
+    starts = rollup_bucket_starts(epoch)
+    return [(bucket, starts[bucket], event_type or "", location or "", camera_id or 0, count) for bucket in ROLLUP_BUCKETS]
+
+def update_alert_rollups(db, epoch, event_type, location, camera_id):
+    """Count one alert into every rollup bucket, in the caller's transaction."""
+    db.executemany(
+        """
+        INSERT INTO alert_rollup (bucket, bucket_start, event_type, location, camera_id, count) VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT (bucket, bucket_start, event_type, location, camera_id) DO UPDATE SET count = count + excluded.count
+        """,
+        rollup_rows(epoch, event_type, location, camera_id)
+    )
+
+def rebuild_alert_rollups(db):
+    """Recount alert_rollup from the whole alert table (only needed once, when it is created)."""
+    counts = collections.Counter()
+    for epoch, event_type, location, camera_id in db.execute("SELECT detected_epoch, event_type, location, camera_id FROM alert"):
+        for row in rollup_rows(epoch or 0, event_type, location, camera_id):
+            counts[row[:5]] += 1
+    db.execute("DELETE FROM alert_rollup")
+    db.executemany("INSERT INTO alert_rollup (bucket, bucket_start, event_type, location, camera_id, count) VALUES (?, ?, ?, ?, ?, ?)",
+                   [key + (count,) for key, count in counts.items()])
+    print(f"Built incident rollups ({len(counts)} rows)")
+
+def migrate_alert_schema():
+    """
+    Add the sortable detected_epoch column (backfilled from the detected_at text), the
+    indexes used by the alert stream, listings and filters, and the incident rollup table.
+    Safe to run on every start.
+    """
+    if not os.path.exists(DB_PATH):
+        return
+    db = alert_database.connect()
+    try:
+        columns = [row[1] for row in db.execute("PRAGMA table_info(alert)")]
+        if not columns:
+            return  # Database not created yet (see db/create_data.sql)
+        if "detected_epoch" not in columns:
+            db.execute("ALTER TABLE alert ADD COLUMN detected_epoch INTEGER")
+            rows = db.execute("SELECT id, detected_at FROM alert").fetchall()
+            db.executemany("UPDATE alert SET detected_epoch = ? WHERE id = ?", [(alert_epoch(detected_at), alert_id) for alert_id, detected_at in rows])
+            print(f"Added detected_epoch to {len(rows)} alerts")
+        db.execute("CREATE INDEX IF NOT EXISTS idx_alert_resolved_id ON alert (resolved, id)")
+        db.execute("CREATE INDEX IF NOT EXISTS idx_alert_detected_epoch ON alert (detected_epoch)")
+        db.execute("CREATE INDEX IF NOT EXISTS idx_alert_event_type ON alert (event_type, detected_epoch)")
+        db.execute("CREATE INDEX IF NOT EXISTS idx_alert_camera_id ON alert (camera_id, detected_epoch)")
+        if not db.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'alert_rollup'").fetchone():
+            db.execute(ALERT_ROLLUP_SCHEMA)
+            rebuild_alert_rollups(db)
+        db.commit()
+    finally:
+        db.close()
+
+migrate_alert_schema()
+
+def parse_time_arg(value):
+    """Epoch seconds or an ISO date/datetime from a query string."""
+    if value is None or value == "":
+        return None
+    try:
+        return int(float(value))
+    except ValueError:
+        return int(datetime.fromisoformat(value).timestamp())
+
+def alert_page_query(columns, default_limit=None):
+    """
+    Build a newest-first alert query from the request's filters and keyset cursor.
+    Supported arguments: from/to (epoch or ISO time), event_type, camera_id, limit and cursor
+    (the X-Next-Cursor of the previous page). Returns (sql, params, limit).
+    """
+    conditions = []
+    params = []
+    start = parse_time_arg(request.args.get("from"))
+    end = parse_time_arg(request.args.get("to"))
+    if start is not None:
+        conditions.append("detected_epoch >= ?")
+        params.append(start)
+    if end is not None:
+        conditions.append("detected_epoch < ?")
+        params.append(end)
+    if request.args.get("event_type"):
+        conditions.append("event_type = ?")
+        params.append(request.args["event_type"])
+    if request.args.get("camera_id"):
+        conditions.append("camera_id = ?")
+        params.append(int(request.args["camera_id"]))
+    cursor = request.args.get("cursor")
+    if cursor:
+        cursor_epoch, cursor_id = (int(part) for part in cursor.split("_"))
+        conditions.append("(detected_epoch, id) < (?, ?)")
+        params.extend([cursor_epoch, cursor_id])
+
+    limit = request.args.get("limit", default_limit)
+    if limit is not None:
+        limit = int(limit)
+        if limit < 1:
+            raise ValueError("limit must be at least 1")
+        limit = min(limit, alert_max_page_size)
+    sql = f"SELECT {columns} FROM alert"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += " ORDER BY detected_epoch DESC, id DESC"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit + 1)  # One extra row tells whether there is a next page
+    return sql, params, limit
+
+def alert_page_response(rows, limit, to_json):
+    """JSON list of the page, with X-Next-Cursor set when more rows follow."""
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = f"{rows[-1]['detected_epoch']}_{rows[-1]['id']}"
+    response = jsonify([to_json(row) for row in rows])
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response
 
 # SECTION: User Registration and Login API
 class User(UserMixin):
@@ -827,36 +2821,52 @@ def change_password():
     return jsonify({'message': 'Password updated successfully'}), 200
 
 # SECTION: Streaming and Managing Alerts API
+def fetch_unresolved_alerts(last_id):
+    """
+    Unresolved alerts with id > last_id, used when a client connects or falls behind the bus, and
+    the newest alert id they were read up to. Anything after that id arrives through the bus.
+    """
+    with alert_database.reader() as db:
+        newest_id = db.execute("SELECT COALESCE(MAX(id), 0) FROM alert").fetchone()[0]
+        alerts = db.execute("SELECT * FROM alert WHERE id > ? AND id <= ? AND resolved = 0 ORDER BY id", (last_id, newest_id))
+        return [dict(alert) for alert in alerts], max(last_id, newest_id)
+
 @app.route('/stream_alerts', methods=['GET'])
 def stream_alerts():
-    def event_stream():
-        db = get_db()
-        cursor = db.cursor()
-        last_id = 0  # Track the last alert ID sent to the client
+    # EventSource sends Last-Event-ID when it reconnects; without it every unresolved alert is replayed
+    try:
+        last_id = int(request.headers.get('Last-Event-ID') or request.args.get('last_event_id', 0))
+    except ValueError:
+        last_id = 0
 
+    def event_stream(last_id):
+        alerts = None
         while True:
-            # Fetch new unresolved alerts (those with ID > last_id and resolved = 0)
-            cursor.execute("SELECT * FROM alert WHERE id > ? AND resolved = 0 ORDER BY detected_at DESC", (last_id,))
-            alerts = cursor.fetchall()
-
+            watermark = last_id
+            if alerts is None:  # Connecting, or missed more than the bus keeps
+                alerts, watermark = fetch_unresolved_alerts(last_id)
             if alerts:
                 for alert in alerts:
-                    last_id = alert['id']  # Update the last sent alert ID
-                    data = json.dumps(dict(alert))  # Convert alert to JSON
-                    yield f"data: {data}\n\n"  # SSE format
-
-            time.sleep(1)  # Polling interval (can be adjusted)
+                    if alert["id"] > last_id:
+                        last_id = alert["id"]
+                        yield f"id: {alert['id']}\ndata: {json.dumps(alert)}\n\n"  # SSE format
+            else:
+                yield ": keepalive\n\n"  # Lets the server notice closed connections
+            last_id = max(last_id, watermark)  # Skip resolved alerts, in the table and in the bus history
+            alerts = alert_bus.wait_for_alerts(last_id, timeout=15)
 
-    return Response(stream_with_context(event_stream()), content_type='text/event-stream')
+    return Response(event_stream(last_id), content_type='text/event-stream')
 
 # alert notification
 @app.route('/get_alerts', methods=['GET'])
 def get_alerts():
-    db = get_db()
-    cursor = db.cursor()
-    cursor.execute("SELECT * FROM alert WHERE resolved IN (0, 1) ORDER BY detected_at DESC")
-    alerts = cursor.fetchall()
-    return jsonify([dict(alert) for alert in alerts])
+    """Newest alerts first, a page at a time (see alert_page_query for the filters)."""
+    try:
+        sql, params, limit = alert_page_query("*", default_limit=alert_page_size)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid filter: {e}"}), 400
+    alerts = get_db().execute(sql, params).fetchall()
+    return alert_page_response(alerts, limit, dict)
 
 @app.route('/clear_alerts', methods=['POST'])
 def clear_alerts():
@@ -869,15 +2879,77 @@ def clear_alerts():
 # Section: analytics incidents
 @app.route("/api/incidents", methods=["GET"])
 def get_incidents():
-    db = get_db()
-    query = "SELECT detected_at, event_type, camera_title, location FROM alert ORDER BY detected_at DESC"
-    incidents = db.execute(query).fetchall()
-    
-    results = [
-        {"detected_at": row["detected_at"], "event_type": row["event_type"], "camera_title": row["camera_title"], "location": row["location"]}
-        for row in incidents
+    """All incidents unless limit/cursor or a time range is given."""
+    try:
+        sql, params, limit = alert_page_query("id, detected_at, detected_epoch, event_type, camera_title, location")
+    except ValueError as e:
+        return jsonify({"error": f"Invalid filter: {e}"}), 400
+    incidents = get_db().execute(sql, params).fetchall()
+    return alert_page_response(incidents, limit, lambda row: {
+        "detected_at": row["detected_at"], "event_type": row["event_type"], "camera_title": row["camera_title"], "location": row["location"]
+    })
+
+ROLLUP_GROUP_COLUMNS = ("event_type", "location", "camera_id")
+
+def query_incident_rollups(db, bucket, start=None, end=None, group_by=()):
+    """Summed alert counts per bucket_start and group_by columns, oldest bucket first."""
+    columns = ", ".join(("bucket_start",) + tuple(group_by))
+    conditions = ["bucket = ?"]
+    params = [bucket]
+    if start is not None:
+        conditions.append("bucket_start >= ?")
+        params.append(start)
+    if end is not None:
+        conditions.append("bucket_start < ?")
+        params.append(end)
+    rows = db.execute(
+        f"SELECT {columns}, SUM(count) AS count FROM alert_rollup WHERE {' AND '.join(conditions)} GROUP BY {columns} ORDER BY bucket_start",
+        params
+    ).fetchall()
+    return [dict(row) for row in rows]
+
+def parse_rollup_args():
+    bucket = request.args.get("bucket", "day")
+    if bucket not in ROLLUP_BUCKETS:
+        raise ValueError(f"bucket must be one of {', '.join(ROLLUP_BUCKETS)}")
+    group_by = [column for column in request.args.get("group_by", "event_type").split(",") if column]
+    for column in group_by:
+        if column not in ROLLUP_GROUP_COLUMNS:
+            raise ValueError(f"group_by columns must be among {', '.join(ROLLUP_GROUP_COLUMNS)}")
+    return bucket, parse_time_arg(request.args.get("from")), parse_time_arg(request.args.get("to")), group_by
+
+@app.route("/api/incidents/summary", methods=["GET"])
+def get_incident_summary():
+    """
+    Alert counts per hour, day or month from the rollup table.
+    Arguments: bucket (hour, day, month), from/to and group_by (comma separated event_type, location, camera_id).
+    """
+    try:
+        bucket, start, end, group_by = parse_rollup_args()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(query_incident_rollups(get_db(), bucket, start, end, group_by))
+
+@app.route("/api/incidents/report", methods=["GET"])
+def get_incident_report():
+    """Incident report (counts per bucket, event type and location) built from the rollups."""
+    try:
+        bucket, start, end, _ = parse_rollup_args()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    rows = query_incident_rollups(get_db(), bucket, start, end, ("event_type", "location"))
+    time_format = {"hour": "%m-%d-%y_%I%p", "day": "%m-%d-%y", "month": "%m-%Y"}[bucket]
+    report = [
+        {
+            "period": datetime.fromtimestamp(row["bucket_start"]).strftime(time_format),
+            "period_start": row["bucket_start"],
+            "event_type": row["event_type"],
+            "location": row["location"],
+            "count": row["count"]
+        }
+        for row in rows
     ]
-    return jsonify(results)
+    return jsonify(report)
 
 @app.route('/send_pushover_notification', methods=['POST'])
 def send_pushover_notification():
@@ -885,8 +2957,11 @@ def send_pushover_notification():
         return jsonify({"success": False, "message": "Mobile alerts disabled"}), 403
     
     data = request.json
-    message = data.get("message", "New alert received")
+    status, response_data = push_mobile_notification(data.get("message", "New alert received"))
+    return jsonify({"status": status, "response": response_data})
 
+def push_mobile_notification(message):
+    """Send a Pushover message; returns the HTTP status and response body."""
     conn = http.client.HTTPSConnection("api.pushover.net")
     conn.request("POST", "/1/messages.json",
       urllib.parse.urlencode({
@@ -897,8 +2972,7 @@ def send_pushover_notification():
       { "Content-type": "application/x-www-form-urlencoded" })
 
     response = conn.getresponse()
-    response_data = response.read().decode()
-    return jsonify({"status": response.status, "response": response_data})
+    return response.status, response.read().decode()
 
 # Camera Device Management API
 @app.route('/get_devices', methods=['GET'])
@@ -927,9 +3001,7 @@ def update_device():
     device_id = data['id']
 
     # Stop the stream if it's running
-    if device_id in active_streams_dict:
-        active_streams_dict[device_id] = False  # Signal stream to stop
-        time.sleep(1)  # Give time for the stream to properly stop
+    stop_capture_session(device_id)
 
     db = get_db()
     cursor = db.cursor()
@@ -939,8 +3011,11 @@ def update_device():
     )
     db.commit()
 
-    # Ensure the stream restarts when next requested
-    active_streams_dict.pop(device_id, None)
+    # Keep the playback folder and metadata in step with the new title/location
+    try:
+        update_playback_recorder(str(device_id), data['title'], data['location'])
+    except Exception as e:
+        print(f"Error updating playback folder for {device_id}: {e}")
 
     return jsonify({"success": True})
 
@@ -950,8 +3025,7 @@ def delete_device():
     device_id = data['id']
 
     # Stop the stream if it's running
-    if device_id in active_streams_dict:
-        active_streams_dict[device_id] = False  # Signal stream to stop
+    stop_capture_session(device_id)
 
     db = get_db()
     cursor = db.cursor()
@@ -991,7 +3065,7 @@ def update_settings():
     global detection_mode, performance_metrics_toggle, update_metric_interval, metric_font_size, playback_recording
     global stream_resolution, stream_frame_skip, max_frame_rate, model_version
     global show_bounding_box, show_confidence_value, confidence_level
-    global enable_alert, enable_mobile_alert, enable_record_logging, delay_for_alert_and_record_logging, models
+    global enable_alert, enable_mobile_alert, enable_record_logging, delay_for_alert_and_record_logging
     global alert_sound, alert_duration, alert_volume, alert_sound_name
 
     data = request.get_json()
@@ -1008,17 +3082,15 @@ def update_settings():
     ### print_updated_settings()  # Call the function to print updated settings
 
     if model_updated:
-        try:
-            MODEL_PATHS = [f"model/{model_version}.pt"]
-            models = [YOLO(path).to('cuda') for path in MODEL_PATHS]  # Reload model
-            for model in models:
-                model.fuse()  # Disable fusion to avoid attribute error
-            # print(f"Model {model_version} loaded successfully!")
-        except Exception as e:
-            print(f"Error loading model {model_version}: {e}")
+        model_registry.request_switch(model_version)  # Loads in the background, streams keep the current model
 
     return jsonify(data)
 
+@app.route('/model/status', methods=['GET'])
+def model_status():
+    """Active model, cached models and load progress/timings."""
+    return jsonify(model_registry.snapshot())
+
 # System Settings Overview with Tabulated Display
 def print_updated_settings():
     settings = [
@@ -1052,6 +3124,29 @@ def print_updated_settings():
     print(tabulate(settings, headers=["Setting", "Value", "Setting", "Value", "Setting", "Value"], tablefmt="grid"))
 
 #Section: Sensor Codes
+SENSOR_FIELDS = ("timestamp", "accel_x", "accel_y", "accel_z", "rain_percentage", "temperature", "humidity", "rainfall_mm", "earthquake_magnitude")
+SENSOR_INSERT_SQL = f"INSERT INTO SensorReadings ({', '.join(SENSOR_FIELDS)}, node_id) VALUES ({', '.join('?' * (len(SENSOR_FIELDS) + 1))})"
+SENSOR_METRICS = SENSOR_FIELDS[1:]
+SENSOR_ROLLUPS = (("SensorRollup1d", 86400), ("SensorRollup1h", 3600), ("SensorRollup1m", 60))  # Coarsest first
+SENSOR_ROLLUP_UPSERT_SQL = (
+    "INSERT INTO {table} (bucket_start, node_id, count, "
+    + ", ".join(f"{metric}_sum, {metric}_min, {metric}_max" for metric in SENSOR_METRICS)
+    + f") VALUES ({', '.join('?' * (3 + 3 * len(SENSOR_METRICS)))}) "
+    + "ON CONFLICT (bucket_start, node_id) DO UPDATE SET count = count + excluded.count, "
+    + ", ".join(
+        f"{metric}_sum = {metric}_sum + excluded.{metric}_sum, "
+        f"{metric}_min = min({metric}_min, excluded.{metric}_min), "
+        f"{metric}_max = max({metric}_max, excluded.{metric}_max)"
+        for metric in SENSOR_METRICS
+    )
+)
+sensor_query_max_points = 500  # Auto bucket size keeps a range query under this many points
+SENSOR_QUERY_BUCKETS = (1, 5, 15, 60, 300, 900, 3600, 3 * 3600, 6 * 3600, 86400, 7 * 86400)
+sensor_commit_interval = 1.0  # Seconds the sensor writer gathers readings into one commit
+sensor_batch_max = 10000  # Most readings accepted in one batch request
+earthquake_alert_magnitude = 3.0  # Node-reported magnitude that triggers on its own
+flood_alert_rainfall_mm = 50.0  # Rainfall accumulated over flood_window_seconds
+
 def init_sensor_db():
     # Ensure the 'db' folder exists
     os.makedirs("db", exist_ok=True)
@@ -1059,9 +3154,9 @@ def init_sensor_db():
     # Define the database path inside the 'db' folder
     db_path = os.path.join("db", "sensor_data.db")
 
-    sensor_db = sqlite3.connect(db_path, check_same_thread=False)
-    cursor = sensor_db.cursor()
-    cursor.execute(
+    sensor_database = Database(db_path, max_batch=10000, commit_interval=sensor_commit_interval)
+    connection = sensor_database.connect()
+    connection.execute(
         """
         CREATE TABLE IF NOT EXISTS SensorReadings (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -1073,73 +3168,610 @@ def init_sensor_db():
             temperature REAL,
             humidity REAL,
             rainfall_mm REAL,
-            earthquake_magnitude REAL
+            earthquake_magnitude REAL,
+            node_id INTEGER DEFAULT 0
         )
         """
     )
-    sensor_db.commit()
-    return sensor_db
+    if "node_id" not in [row[1] for row in connection.execute("PRAGMA table_info(SensorReadings)")]:
+        connection.execute("ALTER TABLE SensorReadings ADD COLUMN node_id INTEGER DEFAULT 0")
+    connection.execute("CREATE INDEX IF NOT EXISTS idx_sensor_readings_timestamp ON SensorReadings (timestamp)")
+    connection.execute("CREATE INDEX IF NOT EXISTS idx_sensor_readings_node_timestamp ON SensorReadings (node_id, timestamp)")
+
+    # Per-node sum/min/max/count of every metric per minute, hour and day, kept current on insert
+    metric_columns = ", ".join(f"{metric}_sum REAL, {metric}_min REAL, {metric}_max REAL" for metric in SENSOR_METRICS)
+    for table, seconds in SENSOR_ROLLUPS:
+        if connection.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone():
+            continue
+        connection.execute(
+            f"CREATE TABLE {table} (bucket_start INTEGER NOT NULL, node_id INTEGER NOT NULL, count INTEGER NOT NULL, "
+            f"{metric_columns}, PRIMARY KEY (bucket_start, node_id)) WITHOUT ROWID"
+        )
+        aggregates = ", ".join(f"SUM({metric}), MIN({metric}), MAX({metric})" for metric in SENSOR_METRICS)
+        connection.execute(
+            f"INSERT INTO {table} SELECT (timestamp / {seconds}) * {seconds}, COALESCE(node_id, 0), COUNT(*), {aggregates} "
+            f"FROM SensorReadings WHERE timestamp IS NOT NULL GROUP BY 1, 2"
+        )
+    connection.commit()
+    connection.close()
+    return sensor_database
 
 # Initialize sensor database
-sensor_db = init_sensor_db()
+sensor_database = init_sensor_db()
+
+@app.route('/db/stats', methods=['GET'])
+def database_stats():
+    """Writer queue depth, group commits and idle read connections for each database."""
+    return jsonify([alert_database.stats(), sensor_database.stats()])
+
+def readings_to_array(readings):
+    """
+    Convert reading dicts to a float array (one row per reading, SENSOR_FIELDS order) and node ids.
+    Missing or non-numeric values become NaN so validation can reject them in one pass.
+    """
+    values = np.full((len(readings), len(SENSOR_FIELDS)), np.nan)
+    node_ids = np.zeros(len(readings), dtype=np.int64)
+    dict_rows = [i for i, reading in enumerate(readings) if isinstance(reading, dict)]
+    if not dict_rows:
+        return values, node_ids
+    try:
+        values[dict_rows] = np.array([[readings[i].get(field) for field in SENSOR_FIELDS] for i in dict_rows], dtype=float)
+        node_ids[dict_rows] = np.array([readings[i].get("node_id") or 0 for i in dict_rows], dtype=np.int64)
+    except (TypeError, ValueError):
+        for i in dict_rows:  # Some value is not a number; find which rows one by one
+            try:
+                values[i] = np.array([readings[i].get(field) for field in SENSOR_FIELDS], dtype=float)
+                node_ids[i] = int(readings[i].get("node_id") or 0)
+            except (TypeError, ValueError):
+                values[i] = np.nan
+    return values, node_ids
+
+def validate_readings(values):
+    """Boolean mask of rows with every field present and within physical limits."""
+    field = {name: values[:, i] for i, name in enumerate(SENSOR_FIELDS)}
+    with np.errstate(invalid="ignore"):
+        return (
+            np.isfinite(values).all(axis=1)
+            & (field["timestamp"] > 0)
+            & (field["rain_percentage"] >= 0) & (field["rain_percentage"] <= 100)
+            & (field["humidity"] >= 0) & (field["humidity"] <= 100)
+            & (field["rainfall_mm"] >= 0)
+            & (field["earthquake_magnitude"] >= 0)
+        )
+
+def sensor_rollup_rows(values, node_ids, bucket_seconds):
+    """Aggregate a batch per (bucket_start, node_id) into SENSOR_ROLLUP_UPSERT_SQL parameter rows."""
+    bucket_starts = (values[:, 0].astype(np.int64) // bucket_seconds) * bucket_seconds
+    keys, groups = np.unique(np.stack([bucket_starts, node_ids], axis=1), axis=0, return_inverse=True)
+    groups = groups.reshape(-1)
+    metrics = values[:, 1:]
+    sums = np.zeros((len(keys), metrics.shape[1]))
+    minimums = np.full((len(keys), metrics.shape[1]), np.inf)
+    maximums = np.full((len(keys), metrics.shape[1]), -np.inf)
+    np.add.at(sums, groups, metrics)
+    np.minimum.at(minimums, groups, metrics)
+    np.maximum.at(maximums, groups, metrics)
+    counts = np.bincount(groups, minlength=len(keys))
+    aggregates = np.stack([sums, minimums, maximums], axis=2).reshape(len(keys), -1)  # sum, min, max per metric
+    return [(bucket_start, node_id, count, *row) for (bucket_start, node_id), count, row
+            in zip(keys.tolist(), counts.tolist(), aggregates.tolist())]
+
+def store_sensor_readings(values, node_ids):
+    """
+    Queue validated readings and their rollup updates as one job for the sensor writer, push them
+    to live dashboards and run them through event detection. The rollup aggregation is done here so the
+    writer only runs SQL.
+    """
+    rows = [(int(row[0]), *row[1:], node_id) for row, node_id in zip(values.tolist(), node_ids.tolist())]
+    rollups = [(table, sensor_rollup_rows(values, node_ids, seconds)) for table, seconds in SENSOR_ROLLUPS]
+
+    def write(db):
+        db.executemany(SENSOR_INSERT_SQL, rows)
+        for table, rollup_rows in rollups:
+            db.executemany(SENSOR_ROLLUP_UPSERT_SQL.format(table=table), rollup_rows)
+        return len(rows)
+
+    sensor_database.submit(write, table="SensorReadings")
+    sensor_stream.publish(values, node_ids)
+    sensor_detector.process(values, node_ids)
 
 # Add new routes for sensor data handling
 @app.route("/sensor/data", methods=["POST"])
 def receive_sensor_data():
     """Receive data from ESP32"""
     try:
-        data = request.json
-        print("Received sensor data:", data)
-
-        cursor = sensor_db.cursor()
-        cursor.execute(
-            """INSERT INTO SensorReadings 
-            (timestamp, accel_x, accel_y, accel_z, rain_percentage, temperature, humidity, rainfall_mm, earthquake_magnitude) 
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-            (
-                data["timestamp"],
-                data["accel_x"],
-                data["accel_y"],
-                data["accel_z"],
-                data["rain_percentage"],
-                data["temperature"],
-                data["humidity"],
-                data["rainfall_mm"],
-                data["earthquake_magnitude"],
-            ),
-        )
-        sensor_db.commit()
-        
-        # Check for critical conditions and trigger alerts
-        if float(data["earthquake_magnitude"]) > 3.0:  # Example threshold
-            trigger_earthquake_alert(data)
-            
-        if float(data["rainfall_mm"]) > 50.0:  # Example threshold
-            trigger_flood_alert(data)
-            
+        values, node_ids = readings_to_array([request.get_json(silent=True)])
+        if not validate_readings(values)[0]:
+            return jsonify({"error": f"A reading needs numeric {', '.join(SENSOR_FIELDS)}"}), 400
+        store_sensor_readings(values, node_ids)
         return jsonify({"status": "success"}), 201
 
     except Exception as e:
         print("Error processing sensor data:", e)
         return jsonify({"error": str(e)}), 500
-    
-def trigger_earthquake_alert(data):
-    """Handle earthquake alert logic"""
-    magnitude = data["earthquake_magnitude"]
-    message = f"Earthquake detected! Magnitude: {magnitude}"
+
+@app.route("/sensor/data/batch", methods=["POST"])
+def receive_sensor_batch():
+    """
+    Receive many readings at once, as a JSON array or as NDJSON (one reading per line).
+    Valid readings are stored; the indexes of rejected ones are returned.
+    """
+    body = request.get_data(as_text=True)
+    readings = []
+    if body.lstrip().startswith("["):
+        try:
+            readings = json.loads(body)
+        except json.JSONDecodeError as e:
+            return jsonify({"error": f"Invalid JSON: {e}"}), 400
+    else:
+        for line in body.splitlines():
+            if line.strip():
+                try:
+                    readings.append(json.loads(line))
+                except json.JSONDecodeError:
+                    readings.append(None)  # Rejected below, keeps the line numbering
+    if len(readings) > sensor_batch_max:
+        return jsonify({"error": f"At most {sensor_batch_max} readings per request"}), 413
+
+    values, node_ids = readings_to_array(readings)
+    valid = validate_readings(values)
+    if valid.any():
+        store_sensor_readings(values[valid], node_ids[valid])
+    return jsonify({"accepted": int(valid.sum()), "rejected": np.flatnonzero(~valid).tolist()}), 202
+
+# SUBSECTION: Live Sensor Stream (per-node ring buffers pushed over SSE)
+sensor_ring_size = 600  # Recent readings kept in memory per node
+sensor_stream_max_rate = 50  # Upper bound on readings per second per node a client may ask for
+
+class SensorStream:
+    """
+    Recent readings of every node in memory, appended straight from the ingestion path. SSE clients
+    read from here, so open dashboards cost no SQLite queries.
+    """
+    def __init__(self, ring_size):
+        self.ring_size = ring_size
+        self.rings = {}  # node_id -> deque of (sequence, received_at, reading values)
+        self.sequence = 0
+        self.node_sequences = {}  # node_id -> sequence of its newest reading, so filtered clients wake only for their node
+        self.condition = threading.Condition()
+
+    def publish(self, values, node_ids, received_at=None):
+        received_at = received_at or time.time()
+        with self.condition:
+            for row, node_id in zip(values.tolist(), node_ids.tolist()):
+                self.sequence += 1
+                ring = self.rings.get(node_id)
+                if ring is None:
+                    ring = self.rings[node_id] = collections.deque(maxlen=self.ring_size)
+                ring.append((self.sequence, received_at, row))
+                self.node_sequences[node_id] = self.sequence
+            self.condition.notify_all()
+
+    def readings_since(self, last_sequence, node_id=None):
+        """(sequence, received_at, node_id, values) newer than last_sequence, oldest first. Caller holds the condition."""
+        nodes = [node_id] if node_id is not None else list(self.rings)
+        readings = []
+        for node in nodes:
+            for sequence, received_at, row in reversed(self.rings.get(node, ())):
+                if sequence <= last_sequence:
+                    break
+                readings.append((sequence, received_at, node, row))
+        readings.sort(key=lambda reading: reading[0])
+        return readings
+
+    def recent(self, node_id=None, count=20):
+        """The newest count readings per node, for a client that just connected."""
+        with self.condition:
+            nodes = [node_id] if node_id is not None else list(self.rings)
+            readings = [(sequence, received_at, node, row) for node in nodes
+                        for sequence, received_at, row in list(self.rings.get(node, ()))[-count:]]
+            return sorted(readings, key=lambda reading: reading[0]), self.sequence
+
+    def since(self, last_sequence, node_id=None):
+        """Readings after last_sequence (a client's Last-Event-ID) and the current sequence."""
+        with self.condition:
+            return self.readings_since(last_sequence, node_id), self.sequence
+
+    def wait(self, last_sequence, node_id, timeout):
+        """Wait until node_id (or any node) has readings after last_sequence, or timeout."""
+        def has_new_readings():
+            newest = self.sequence if node_id is None else self.node_sequences.get(node_id, 0)
+            return newest > last_sequence
+
+        with self.condition:
+            self.condition.wait_for(has_new_readings, timeout)
+            return self.readings_since(last_sequence, node_id), self.sequence
+
+    def prime(self, database, count=20):
+        """Fill the rings with the newest stored readings once at startup."""
+        with database.reader() as db:
+            rows = db.execute(f"SELECT {', '.join(SENSOR_FIELDS)}, node_id FROM SensorReadings ORDER BY timestamp DESC LIMIT ?",
+                              (count * 10,)).fetchall()
+        rows = [tuple(row) for row in reversed(rows)]
+        if rows:
+            values = np.array([row[:-1] for row in rows], dtype=float)
+            node_ids = np.array([row[-1] or 0 for row in rows], dtype=np.int64)
+            self.publish(values, node_ids)
+
+def sensor_reading_json(sequence, node_id, row):
+    reading = dict(zip(SENSOR_FIELDS, row))
+    reading["timestamp"] = int(reading["timestamp"])
+    reading["node_id"] = node_id
+    reading["sequence"] = sequence
+    return reading
+
+sensor_stream = SensorStream(sensor_ring_size)
+try:
+    sensor_stream.prime(sensor_database)
+except sqlite3.Error as e:
+    print(f"Could not load recent sensor readings: {e}")
+
+@app.route("/sensor/stream", methods=["GET"])
+def stream_sensor_data():
+    """
+    SSE feed of new readings. Arguments: node_id (default all nodes) and rate, the most readings
+    per second per node to send, by reading timestamp (default every reading, at most sensor_stream_max_rate
+    when given). Each event is a JSON list of readings with the stream sequence as its id; the first one
+    holds the newest readings already in memory, or those after Last-Event-ID when the client reconnects.
+    """
+    try:
+        node_id = int(request.args["node_id"]) if request.args.get("node_id") else None
+        rate = min(float(request.args["rate"]), sensor_stream_max_rate) if request.args.get("rate") else None
+        last_event_id = int(request.headers.get("Last-Event-ID") or 0)
+    except ValueError:
+        return jsonify({"error": "node_id must be an integer and rate a number"}), 400
+    min_interval = 1.0 / rate if rate else 0.0
+    if rate:
+        # Readings are sent in windows of whole timestamp seconds: up to rate per second, or one per 1 / rate seconds
+        window = max(1.0, 1.0 / rate)
+        per_window = max(1, int(rate * window))
+
+    def event_stream():
+        if 0 < last_event_id <= sensor_stream.sequence:
+            readings, last_sequence = sensor_stream.since(last_event_id, node_id)
+        else:  # New client, or the server restarted and the sequence began again
+            readings, last_sequence = sensor_stream.recent(node_id)
+        sent = {}  # node_id -> (timestamp window, readings sent in it), for decimation
+        while True:
+            batch = []
+            for sequence, received_at, node, row in readings:
+                if rate:
+                    slot = row[0] // window
+                    sent_slot, count = sent.get(node, (None, 0))
+                    if slot == sent_slot and count >= per_window:
+                        continue
+                    sent[node] = (slot, count + 1 if slot == sent_slot else 1)
+                batch.append(sensor_reading_json(sequence, node, row))
+            if batch:
+                yield f"id: {last_sequence}\ndata: {json.dumps(batch)}\n\n"
+            elif not readings:
+                yield ": keepalive\n\n"  # Lets the server notice closed dashboards
+            time.sleep(min(min_interval, 1.0))  # Coalesce bursts into one event per interval
+            readings, last_sequence = sensor_stream.wait(last_sequence, node_id, timeout=15)
+
+    return Response(event_stream(), mimetype="text/event-stream")
+
+# SUBSECTION: Sensor Event Detection (per-node windows, STA/LTA, PGA, rolling rainfall, hysteresis)
+# Acceleration is in the units the nodes send (m/s², gravity included). Sample windows are counts of
+# readings, rainfall_mm is the depth measured since the node's previous reading.
+seismic_sta_samples = 20  # Short-term average window (1 s at 20 Hz)
+seismic_lta_samples = 400  # Long-term average window (20 s at 20 Hz), also the per-node ring size
+seismic_trigger_on = 4.0  # STA/LTA ratio that turns a node's seismic trigger on
+seismic_trigger_off = 1.5  # Ratio below which it turns off again
+seismic_min_pga = 0.1  # Peak dynamic acceleration a trigger also needs, ignores ratio spikes on a quiet floor
+seismic_coincidence_nodes = 1  # Nodes that must trigger together before an earthquake alert is raised
+flood_window_seconds = 3600  # Rolling rainfall accumulation window
+flood_trigger_off_ratio = 0.8  # Flood trigger turns off below this fraction of flood_alert_rainfall_mm
+sensor_alert_cooldown = 60  # Seconds after an event ends before the same kind of event alerts again
+sensor_trigger_timeout = 30  # A triggered node that has sent nothing for this long no longer holds its event open
+
+class NodeWindow:
+    """Ring buffers for one node: the last seismic_lta_samples accelerations with their characteristic
+    function values, and rainfall totals per second over flood_window_seconds."""
+    def __init__(self, capacity, rain_seconds):
+        self.samples = np.zeros((capacity, 4))  # accel_x, accel_y, accel_z, characteristic function
+        self.head = 0
+        self.count = 0
+        self.rain = np.zeros(rain_seconds)
+        self.rain_second = np.full(rain_seconds, -1, dtype=np.int64)
+        self.seismic_on = False
+        self.flood_on = False
+        self.last_seen = 0.0
+
+    def history(self):
+        """Stored samples, oldest first."""
+        capacity = len(self.samples)
+        if self.count < capacity:
+            return self.samples[:self.count]
+        return np.roll(self.samples, -self.head, axis=0)
+
+    def append(self, rows):
+        capacity = len(self.samples)
+        rows = rows[-capacity:]
+        self.samples[(self.head + np.arange(len(rows))) % capacity] = rows
+        self.head = (self.head + len(rows)) % capacity
+        self.count = min(self.count + len(rows), capacity)
+
+    def add_rain(self, timestamps, rainfall):
+        """Add rainfall to per-second slots and return the accumulation over the window."""
+        window = len(self.rain)
+        seconds, groups = np.unique(timestamps, return_inverse=True)
+        totals = np.bincount(groups.reshape(-1), weights=rainfall)
+        slots = seconds % window
+        current = seconds >= self.rain_second[slots]  # Older than what the slot holds: outside the window already
+        seconds, totals, slots = seconds[current], totals[current], slots[current]
+        stale = self.rain_second[slots] != seconds
+        self.rain[slots[stale]] = 0.0
+        self.rain_second[slots] = seconds
+        np.add.at(self.rain, slots, totals)
+        latest = self.rain_second.max()
+        return float(self.rain[self.rain_second > latest - window].sum())
+
+def hysteresis(on, off, state):
+    """Trigger state after each sample: set where on, cleared where off, otherwise held (starting from state)."""
+    changes = np.flatnonzero(on | off)
+    if not changes.size:
+        return np.full(len(on), state)
+    last_change = np.full(len(on), -1)
+    last_change[changes] = changes
+    last_change = np.maximum.accumulate(last_change)
+    return np.where(last_change >= 0, on[np.maximum(last_change, 0)], state)
+
+class SensorEventDetector:
+    """
+    Streaming earthquake and flood detection over every stored batch. Per node it keeps ring buffers
+    of acceleration and rainfall and computes, for all new samples at once, the STA/LTA ratio of
+    the dynamic acceleration, its peak (PGA) and the rolling rainfall. Node triggers use on/off
+    thresholds, and all nodes that trigger together form one network event that raises one alert;
+    a new alert of the same kind needs the previous event to have ended sensor_alert_cooldown ago.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.nodes = {}
+        self.events = {"earthquake": None, "flood": None}  # Open network event per kind
+        self.ended_at = {"earthquake": 0.0, "flood": 0.0}
+        self.counters = {"readings": 0, "batches": 0, "events": 0, "alerts": 0, "suppressed": 0, "processing_seconds": 0.0}
+
+    def node(self, node_id):
+        window = self.nodes.get(node_id)
+        if window is None or len(window.samples) != seismic_lta_samples or len(window.rain) != flood_window_seconds:
+            window = self.nodes[node_id] = NodeWindow(seismic_lta_samples, flood_window_seconds)
+        return window
+
+    def process(self, values, node_ids):
+        """Update the windows with a validated batch and raise alerts for new events."""
+        start = time.time()
+        order = np.argsort(node_ids, kind="stable")  # Group by node, keeping arrival order within a node
+        nodes, first = np.unique(node_ids[order], return_index=True)
+        alerts = []
+        with self.lock:
+            features = {"earthquake": {}, "flood": {}}  # Peaks from this batch per triggered node
+            for node_id, rows in zip(nodes.tolist(), np.split(values[order], first[1:])):
+                window = self.node(node_id)
+                window.last_seen = start
+                seismic = self.update_seismic(window, rows)
+                if seismic:
+                    features["earthquake"][node_id] = seismic
+                rainfall = window.add_rain(rows[:, 0].astype(np.int64), rows[:, SENSOR_FIELDS.index("rainfall_mm")])
+                window.flood_on = rainfall >= (flood_trigger_off_ratio if window.flood_on else 1.0) * flood_alert_rainfall_mm
+                if window.flood_on:
+                    features["flood"][node_id] = {"rainfall_mm": round(rainfall, 2)}
+            # Nodes missing from this batch keep their trigger state until they go quiet
+            recent = [(node_id, window) for node_id, window in self.nodes.items() if start - window.last_seen < sensor_trigger_timeout]
+            triggered = {
+                "earthquake": {node_id: features["earthquake"].get(node_id, {}) for node_id, window in recent if window.seismic_on},
+                "flood": {node_id: features["flood"].get(node_id, {}) for node_id, window in recent if window.flood_on}
+            }
+            for kind, nodes_on in triggered.items():
+                alert = self.update_event(kind, nodes_on, start)
+                if alert:
+                    alerts.append(alert)
+            self.counters["readings"] += len(values)
+            self.counters["batches"] += 1
+            self.counters["processing_seconds"] += time.time() - start
+        for kind, event in alerts:
+            trigger = trigger_earthquake_alert if kind == "earthquake" else trigger_flood_alert
+            threading.Thread(target=trigger, args=(event,), name=f"{kind}-alert", daemon=True).start()
+
+    def update_seismic(self, window, rows):
+        """Run STA/LTA over the node's new samples; returns the peak features while triggered."""
+        new_acceleration = rows[:, 1:4]
+        history = window.history()
+        known = len(history)
+        acceleration = np.vstack([history[:, :3], new_acceleration])
+        magnitude = np.linalg.norm(acceleration, axis=1)
+
+        # Dynamic acceleration: magnitude minus its long-term mean, which removes gravity in any orientation
+        positions = np.arange(known, len(magnitude))
+        window_start = np.maximum(positions - seismic_lta_samples + 1, 0)
+        cumulative = np.concatenate(([0.0], np.cumsum(magnitude)))
+        baseline = (cumulative[positions + 1] - cumulative[window_start]) / (positions + 1 - window_start)
+        dynamic = np.abs(magnitude[known:] - baseline)
+        characteristic = np.concatenate([history[:, 3], dynamic ** 2])
+        window.append(np.column_stack([new_acceleration, dynamic ** 2]))
+
+        cumulative = np.concatenate(([0.0], np.cumsum(characteristic)))
+        sta = (cumulative[positions + 1] - cumulative[np.maximum(positions + 1 - seismic_sta_samples, 0)]) / seismic_sta_samples
+        lta = (cumulative[positions + 1] - cumulative[np.maximum(positions + 1 - seismic_lta_samples, 0)]) / seismic_lta_samples
+        ratio = np.where(positions + 1 >= seismic_lta_samples, sta / np.maximum(lta, 1e-12), 0.0)  # 0 until the LTA window is full
+
+        reported = rows[:, SENSOR_FIELDS.index("earthquake_magnitude")] > earthquake_alert_magnitude  # Nodes that compute a magnitude
+        on = ((ratio >= seismic_trigger_on) & (dynamic >= seismic_min_pga)) | reported
+        off = (ratio < seismic_trigger_off) & ~reported
+        state = hysteresis(on, off, window.seismic_on)
+        window.seismic_on = bool(state[-1])
+        if not state.any():
+            return None
+        return {
+            "sta_lta": round(float(ratio[state].max()), 2),
+            "pga": round(float(dynamic[state].max()), 3),
+            "magnitude": round(float(rows[state, SENSOR_FIELDS.index("earthquake_magnitude")].max()), 2)
+        }
+
+    def update_event(self, kind, nodes_on, now):
+        """Fold this batch's triggered nodes into the open event; returns (kind, event) when it should alert."""
+        event = self.events[kind]
+        if not nodes_on:
+            if event is not None:
+                self.events[kind] = None
+                self.ended_at[kind] = now
+            return None
+        if event is None:
+            event = self.events[kind] = {"kind": kind, "started": now, "nodes": {}, "alerted": False}
+            self.counters["events"] += 1
+        for node_id, features in nodes_on.items():
+            peak = event["nodes"].setdefault(node_id, {})
+            for name, value in features.items():
+                peak[name] = max(peak.get(name, value), value)
+        if event["alerted"] or len(event["nodes"]) < (seismic_coincidence_nodes if kind == "earthquake" else 1):
+            return None
+        event["alerted"] = True
+        if now - self.ended_at[kind] < sensor_alert_cooldown:
+            self.counters["suppressed"] += 1
+            return None
+        self.counters["alerts"] += 1
+        return kind, self.event_summary(event)
+
+    @staticmethod
+    def event_summary(event):
+        summary = {"kind": event["kind"], "started": event["started"], "nodes": sorted(event["nodes"])}
+        for features in event["nodes"].values():
+            for name, value in features.items():
+                summary[name] = max(summary.get(name, value), value)
+        return summary
+
+    def stats(self):
+        with self.lock:
+            return {
+                "nodes": len(self.nodes),
+                "triggered": {
+                    "earthquake": sorted(node_id for node_id, window in self.nodes.items() if window.seismic_on),
+                    "flood": sorted(node_id for node_id, window in self.nodes.items() if window.flood_on)
+                },
+                "open_events": {kind: self.event_summary(event) for kind, event in self.events.items() if event},
+                **self.counters
+            }
+
+sensor_detector = SensorEventDetector()
+
+@app.route("/sensor/detection/stats", methods=["GET"])
+def sensor_detection_stats():
+    """Triggered nodes, open events and detection counters."""
+    return jsonify(sensor_detector.stats())
+
+# SUBSECTION: Binary Sensor Listener (UDP datagrams and persistent TCP connections)
+# One reading is SENSOR_RECORD_FORMAT little-endian: uint32 timestamp, eight float32 values in
+# SENSOR_FIELDS order, uint16 node id (38 bytes). A datagram or TCP stream carries any number of them.
+SENSOR_RECORD_FORMAT = "<I8fH"
+SENSOR_RECORD_DTYPE = np.dtype([("timestamp", "<u4")] + [(field, "<f4") for field in SENSOR_FIELDS[1:]] + [("node_id", "<u2")])
+assert SENSOR_RECORD_DTYPE.itemsize == struct.calcsize(SENSOR_RECORD_FORMAT)
+sensor_listener_enabled = True
+sensor_listener_host = "0.0.0.0"
+sensor_listener_port = 5600  # Same port for UDP and TCP
+sensor_listener_flush_interval = 0.2  # Seconds records are gathered before one bulk decode and store
+
+class SensorListener:
+    """
+    Receives binary sensor records over UDP and TCP and hands them to the same validation, storage
+    and alert path as the HTTP endpoints. Receiving threads only append raw bytes; a flush thread
+    decodes everything gathered since the last flush with one np.frombuffer call.
+    """
+    def __init__(self, host, port, flush_interval):
+        self.host = host
+        self.port = port
+        self.flush_interval = flush_interval
+        self.pending = []
+        self.pending_lock = threading.Lock()
+        self.counters = {"records": 0, "rejected": 0, "malformed_datagrams": 0, "batches": 0, "tcp_connections": 0}
+
+    def start(self):
+        for target, name in ((self.run_udp, "sensor-udp"), (self.run_tcp, "sensor-tcp"), (self.run_flush, "sensor-flush")):
+            threading.Thread(target=target, name=name, daemon=True).start()
+        print(f"Sensor listener on UDP/TCP port {self.port}")
+
+    def add(self, data):
+        with self.pending_lock:
+            self.pending.append(data)
+
+    def run_udp(self):
+        udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        udp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)  # Absorb bursts between flushes
+        udp_socket.bind((self.host, self.port))
+        while True:
+            data = udp_socket.recv(65535)
+            if len(data) % SENSOR_RECORD_DTYPE.itemsize:
+                self.counters["malformed_datagrams"] += 1
+                continue
+            self.add(data)
+
+    def run_tcp(self):
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind((self.host, self.port))
+        server.listen()
+        while True:
+            connection, _ = server.accept()
+            self.counters["tcp_connections"] += 1
+            threading.Thread(target=self.handle_tcp, args=(connection,), name="sensor-tcp-client", daemon=True).start()
+
+    def handle_tcp(self, connection):
+        """Pass on whole records and keep any partial one for the next read."""
+        record_size = SENSOR_RECORD_DTYPE.itemsize
+        remainder = b""
+        with connection:
+            while True:
+                data = connection.recv(65536)
+                if not data:
+                    break
+                data = remainder + data
+                complete = len(data) - len(data) % record_size
+                if complete:
+                    self.add(data[:complete])
+                remainder = data[complete:]
+
+    def run_flush(self):
+        while True:
+            time.sleep(self.flush_interval)
+            with self.pending_lock:
+                pending, self.pending = self.pending, []
+            if pending:
+                try:
+                    self.store(b"".join(pending))
+                except Exception as e:
+                    print(f"Error storing binary sensor records: {e}")
+
+    def store(self, data):
+        records = np.frombuffer(data, dtype=SENSOR_RECORD_DTYPE)
+        values = np.column_stack([records[field].astype(np.float64) for field in SENSOR_FIELDS])
+        node_ids = records["node_id"].astype(np.int64)
+        valid = validate_readings(values)
+        self.counters["records"] += len(records)
+        self.counters["rejected"] += int((~valid).sum())
+        self.counters["batches"] += 1
+        if valid.any():
+            store_sensor_readings(values[valid], node_ids[valid])
+
+    def stats(self):
+        with self.pending_lock:
+            pending_bytes = sum(len(data) for data in self.pending)
+        return {"port": self.port, "record_size": SENSOR_RECORD_DTYPE.itemsize, "pending_bytes": pending_bytes, **self.counters}
+
+sensor_listener = SensorListener(sensor_listener_host, sensor_listener_port, sensor_listener_flush_interval)
+
+@app.route("/sensor/listener/stats", methods=["GET"])
+def sensor_listener_stats():
+    return jsonify(sensor_listener.stats())
+
+def trigger_earthquake_alert(event):
+    """Handle earthquake alert logic for one detected event"""
+    message = (f"Earthquake detected on {len(event['nodes'])} sensor node(s)! "
+               f"PGA: {event.get('pga', 0)}, STA/LTA: {event.get('sta_lta', 0)}, Magnitude: {event.get('magnitude', 0)}")
     
     # Format datetime to MM-DD-YY_HH-MM-SSAM/PM
     detected_at = datetime.now().strftime("%m-%d-%y_%I-%M-%S%p")
     
-    # Add to alerts database
-    with app.app_context():
-        db = get_db()
-        cursor = db.cursor()
-        cursor.execute(
-            "INSERT INTO alert (camera_id, camera_title, event_type, location, detected_at) VALUES (?, ?, ?, ?, ?)",
-            (0, "Seismic Sensor", "earthquake", "Sensor Network", detected_at)
-        )
-        db.commit()
+    # Add to alerts database and notify open dashboards
+    record_alert(0, "Seismic Sensor", "earthquake", "Sensor Network", detected_at)
     
     # Play alert sound
     if alert_sound:
@@ -1147,25 +3779,18 @@ def trigger_earthquake_alert(data):
     
     # Send mobile notification
     if enable_mobile_alert:
-        send_pushover_notification(message)
+        push_mobile_notification(message)
 
-def trigger_flood_alert(data):
-    """Handle flood alert logic"""
-    rainfall = data["rainfall_mm"]
-    message = f"Heavy rainfall detected! Accumulated: {rainfall}mm"
+def trigger_flood_alert(event):
+    """Handle flood alert logic for one detected event"""
+    message = (f"Heavy rainfall detected on {len(event['nodes'])} sensor node(s)! "
+               f"Accumulated: {event.get('rainfall_mm', 0)}mm in {flood_window_seconds // 60} minutes")
     
     # Format datetime to MM-DD-YY_HH-MM-SSAM/PM
     detected_at = datetime.now().strftime("%m-%d-%y_%I-%M-%S%p")
     
-    # Add to alerts database
-    with app.app_context():
-        db = get_db()
-        cursor = db.cursor()
-        cursor.execute(
-            "INSERT INTO alert (camera_id, camera_title, event_type, location, detected_at) VALUES (?, ?, ?, ?, ?)",
-            (0, "Rain Sensor", "flood", "Sensor Network", detected_at)
-        )
-        db.commit()
+    # Add to alerts database and notify open dashboards
+    record_alert(0, "Rain Sensor", "flood", "Sensor Network", detected_at)
     
     # Play alert sound
     if alert_sound:
@@ -1173,14 +3798,13 @@ def trigger_flood_alert(data):
     
     # Send mobile notification
     if enable_mobile_alert:
-        send_pushover_notification(message)
+        push_mobile_notification(message)
 
 @app.route("/sensor/fetch_data", methods=["GET"])
 def fetch_sensor_data():
     """Fetch latest sensor readings"""
-    cursor = sensor_db.cursor()
-    cursor.execute("SELECT * FROM SensorReadings ORDER BY timestamp DESC LIMIT 20")
-    results = cursor.fetchall()
+    with sensor_database.reader() as db:
+        results = db.execute("SELECT * FROM SensorReadings ORDER BY timestamp DESC LIMIT 20").fetchall()
 
     data = [
         {
@@ -1201,40 +3825,101 @@ def fetch_sensor_data():
 
 @app.route("/sensor/stats", methods=["GET"])
 def get_sensor_statistics():
-    """Fetch min, max, and average values for each sensor"""
-    cursor = sensor_db.cursor()
-    cursor.execute(
-        """
-        SELECT 
-            AVG(accel_x), MAX(accel_x), MIN(accel_x),
-            AVG(accel_y), MAX(accel_y), MIN(accel_y),
-            AVG(accel_z), MAX(accel_z), MIN(accel_z),
-            AVG(rain_percentage), MAX(rain_percentage), MIN(rain_percentage),
-            AVG(temperature), MAX(temperature), MIN(temperature),
-            AVG(humidity), MAX(humidity), MIN(humidity),
-            AVG(rainfall_mm), MAX(rainfall_mm), MIN(rainfall_mm),
-            AVG(earthquake_magnitude), MAX(earthquake_magnitude), MIN(earthquake_magnitude)
-        FROM SensorReadings
-        """
-    )
-    row = cursor.fetchone()
-    
+    """Fetch min, max, and average values for each sensor (from the daily rollup, optionally within from/to)"""
+    try:
+        start = parse_time_arg(request.args.get("from"))
+        end = parse_time_arg(request.args.get("to"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    aggregates = ", ".join(f"SUM({metric}_sum) / SUM(count), MAX({metric}_max), MIN({metric}_min)" for metric in SENSOR_METRICS)
+    with sensor_database.reader() as db:
+        row = db.execute(
+            f"SELECT {aggregates} FROM SensorRollup1d WHERE bucket_start >= ? AND bucket_start < ?",
+            (start if start is not None else 0, end if end is not None else 2 ** 62)
+        ).fetchone()
+
     stats = {
-        "accel_x": {"avg": row[0], "max": row[1], "min": row[2]},
-        "accel_y": {"avg": row[3], "max": row[4], "min": row[5]},
-        "accel_z": {"avg": row[6], "max": row[7], "min": row[8]},
-        "rain_percentage": {"avg": row[9], "max": row[10], "min": row[11]},
-        "temperature": {"avg": row[12], "max": row[13], "min": row[14]},
-        "humidity": {"avg": row[15], "max": row[16], "min": row[17]},
-        "rainfall_mm": {"avg": row[18], "max": row[19], "min": row[20]},
-        "earthquake_magnitude": {"avg": row[21], "max": row[22], "min": row[23]},
+        metric: {"avg": row[3 * i], "max": row[3 * i + 1], "min": row[3 * i + 2]}
+        for i, metric in enumerate(SENSOR_METRICS)
     }
     return jsonify(stats)
 
+def parse_bucket_arg(value, start, end):
+    """Bucket size in seconds from '300', '5m', '1h', '1d' or 'auto' (fits the range in sensor_query_max_points)."""
+    if value in (None, "", "auto"):
+        span = max(1, end - start)
+        return next((size for size in SENSOR_QUERY_BUCKETS if span / size <= sensor_query_max_points), SENSOR_QUERY_BUCKETS[-1])
+    units = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+    seconds = int(value[:-1]) * units[value[-1]] if value[-1] in units else int(value)
+    if seconds <= 0:
+        raise ValueError("bucket must be positive")
+    return seconds
+
+@app.route("/sensor/query", methods=["GET"])
+def query_sensor_data():
+    """
+    Sensor readings aggregated per time bucket. Arguments: from/to (epoch or ISO time, default the
+    last 24 hours), bucket (seconds, 5m/1h/1d style, or auto), node_id and metrics (comma separated).
+    The range is widened to whole buckets and served from the coarsest rollup whose buckets divide them.
+    """
+    try:
+        end = parse_time_arg(request.args.get("to")) or int(time.time())
+        start = parse_time_arg(request.args.get("from"))
+        start = start if start is not None else end - 86400
+        bucket = parse_bucket_arg(request.args.get("bucket"), start, end)
+        metrics = [metric for metric in request.args.get("metrics", ",".join(SENSOR_METRICS)).split(",") if metric]
+        for metric in metrics:
+            if metric not in SENSOR_METRICS:
+                raise ValueError(f"unknown metric {metric}")
+        node_id = request.args.get("node_id")
+        node_id = int(node_id) if node_id not in (None, "") else None
+    except (ValueError, KeyError) as e:
+        return jsonify({"error": f"Invalid query: {e}"}), 400
+    if (end - start) / bucket > 100 * sensor_query_max_points:
+        return jsonify({"error": "Too many points, use a larger bucket"}), 400
+
+    start = (start // bucket) * bucket
+    end = -(-end // bucket) * bucket
+    source = next((table for table, seconds in SENSOR_ROLLUPS if bucket % seconds == 0), "SensorReadings")
+    if source == "SensorReadings":
+        time_column, count = "timestamp", "COUNT(*)"
+        aggregates = [f"SUM({metric}), MIN({metric}), MAX({metric})" for metric in metrics]
+    else:
+        time_column, count = "bucket_start", "SUM(count)"
+        aggregates = [f"SUM({metric}_sum), MIN({metric}_min), MAX({metric}_max)" for metric in metrics]
+    sql = (f"SELECT ({time_column} / {bucket}) * {bucket} AS bucket, {count}, {', '.join(aggregates)} "
+           f"FROM {source} WHERE {time_column} >= ? AND {time_column} < ?")
+    params = [start, end]
+    if node_id is not None:
+        sql += " AND node_id = ?"
+        params.append(node_id)
+    sql += " GROUP BY bucket ORDER BY bucket"
+
+    with sensor_database.reader() as db:
+        rows = db.execute(sql, params).fetchall()
+    points = []
+    for row in rows:
+        point = {"bucket_start": row[0], "count": row[1]}
+        for i, metric in enumerate(metrics):
+            total, minimum, maximum = row[2 + 3 * i:5 + 3 * i]
+            point[metric] = {"avg": total / row[1] if row[1] else None, "min": minimum, "max": maximum}
+        points.append(point)
+    return jsonify({"from": start, "to": end, "bucket": bucket, "source": source, "node_id": node_id, "points": points})
+
 # Main entry point for the application execution
 if __name__ == "__main__":
-    # Initialize sensor database
-    init_sensor_db()
+    # Keep yt-dlp current (only when run as the server, not when imported by tools)
+    check_and_update_yt_dlp()
+
+    # Enforce playback age/size quotas in the background
+    playback_retention.start()
+
+    # Accept binary sensor records over UDP/TCP next to the HTTP endpoints
+    if sensor_listener_enabled:
+        sensor_listener.start()
+
+    # Scan the playback folders once and keep the index current from filesystem events
+    playback_index.ensure_started()
 
     # Start the Flask server in a separate thread to keep the main thread available for other tasks.
     flask_thread = threading.Thread(target=lambda: app.run(host='0.0.0.0', port=FLASK_PORT, threaded=True, use_reloader=False))
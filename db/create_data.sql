@@ -62,5 +62,21 @@ CREATE TABLE alert (
     location TEXT,
     detected_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     resolved INTEGER CHECK(resolved IN (0, 1)) DEFAULT 0,
+    detected_epoch INTEGER,
     FOREIGN KEY (camera_id) REFERENCES camera(id) ON DELETE CASCADE
 );
+
+CREATE INDEX idx_alert_resolved_id ON alert (resolved, id);
+CREATE INDEX idx_alert_detected_epoch ON alert (detected_epoch);
+CREATE INDEX idx_alert_event_type ON alert (event_type, detected_epoch);
+CREATE INDEX idx_alert_camera_id ON alert (camera_id, detected_epoch);
+
+CREATE TABLE alert_rollup (
+    bucket TEXT NOT NULL,
+    bucket_start INTEGER NOT NULL,
+    event_type TEXT NOT NULL,
+    location TEXT NOT NULL,
+    camera_id INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (bucket, bucket_start, event_type, location, camera_id)
+) WITHOUT ROWID;
@@ -137,26 +137,24 @@ document.addEventListener('DOMContentLoaded', function() {
             // Fetch sensor status
             document.getElementById('iot-sensors').textContent = '3'; // Hardcoded for demo
             
-            // Fetch all incidents
-            const incidentsResponse = await fetch('/get_alerts');
-            const allIncidents = await incidentsResponse.json();
-            
-            // Filter incidents from this week
+            // Incident counts come from the server-side rollups, so they cover every alert, not one page
             const now = new Date();
-            const oneWeekAgo = new Date(now.getTime() - 7 * 24 * 60 * 60 * 1000);
-            const thisWeekIncidents = allIncidents.filter(incident => {
-                const incidentDate = new Date(incident.detected_at);
-                return incidentDate >= oneWeekAgo;
-            });
+            const oneWeekAgo = Math.floor((now.getTime() - 7 * 24 * 60 * 60 * 1000) / 1000);
+            const [allTimeRows, thisWeekRows] = await Promise.all([
+                fetch('/api/incidents/summary?bucket=month&group_by=event_type,location').then(response => response.json()),
+                fetch(`/api/incidents/summary?bucket=day&from=${oneWeekAgo}&group_by=`).then(response => response.json())
+            ]);
+            const totalIncidents = allTimeRows.reduce((total, row) => total + row.count, 0);
+            const thisWeekIncidents = thisWeekRows.reduce((total, row) => total + row.count, 0);
             
             // Update counts
-            document.getElementById('incident-count').textContent = allIncidents.length;
-            document.getElementById('incident-this-week-count').textContent = thisWeekIncidents.length;
+            document.getElementById('incident-count').textContent = totalIncidents;
+            document.getElementById('incident-this-week-count').textContent = thisWeekIncidents;
             
             // Calculate most affected location
             const locationCounts = {};
-            allIncidents.forEach(incident => {
-                locationCounts[incident.location] = (locationCounts[incident.location] || 0) + 1;
+            allTimeRows.forEach(row => {
+                locationCounts[row.location] = (locationCounts[row.location] || 0) + row.count;
             });
             
             let mostAffectedLocation = '--';
@@ -172,19 +170,17 @@ document.addEventListener('DOMContentLoaded', function() {
             // Update line chart (last 7 days)
             const days = ['Sun', 'Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat'];
             const dayCounts = [0, 0, 0, 0, 0, 0, 0];
-            
-            thisWeekIncidents.forEach(incident => {
-                const incidentDate = new Date(incident.detected_at);
-                const dayOfWeek = incidentDate.getDay();
-                dayCounts[dayOfWeek]++;
+            thisWeekRows.forEach(row => {
+                const dayOfWeek = new Date(row.bucket_start * 1000).getDay();
+                dayCounts[dayOfWeek] += row.count;
             });
             
             // Update pie chart (incident types)
             const typeCounts = {};
-            allIncidents.forEach(incident => {
-                const types = incident.event_type.split('_');
+            allTimeRows.forEach(row => {
+                const types = row.event_type.split('_');
                 types.forEach(type => {
-                    typeCounts[type] = (typeCounts[type] || 0) + 1;
+                    typeCounts[type] = (typeCounts[type] || 0) + row.count;
                 });
             });
             
@@ -197,47 +193,61 @@ document.addEventListener('DOMContentLoaded', function() {
     
 
     // Function to update sensor data
-    async function updateSensorData() {
-        try {
-            const response = await fetch('/sensor/fetch_data');
-            const data = await response.json();
+    // Live readings are pushed by the server from memory; keep the newest 20 (newest first)
+    let liveReadings = [];
+
+    function renderLiveReadings(data) {
+        if (data && data.length > 0) {
+            // Update last updated time
+            const now = new Date();
+            document.getElementById('last-updated').textContent = `Last updated: ${now.toLocaleTimeString()}`;
+            
+            // Get latest reading
+            const latest = data[0];
+            
+            // Update current values
+            document.getElementById('temperature-value').textContent = `${latest.temperature.toFixed(1)} °C`;
+            document.getElementById('humidity-value').textContent = `${latest.humidity.toFixed(1)} %`;
+            document.getElementById('rainfall-value').textContent = `${latest.rainfall_mm.toFixed(1)} mm`;
+            document.getElementById('seismic-value').textContent = `${latest.earthquake_magnitude.toFixed(1)} M`;
             
-            if (data && data.length > 0) {
-                // Update connection status
-                document.getElementById('sensor-connection-status').className = 'status-online';
-                document.getElementById('sensor-connection-status').textContent = 'Online';
-                
-                // Update last updated time
-                const now = new Date();
-                document.getElementById('last-updated').textContent = `Last updated: ${now.toLocaleTimeString()}`;
-                
-                // Get latest reading
-                const latest = data[0];
-                
-                // Update current values
-                document.getElementById('temperature-value').textContent = `${latest.temperature.toFixed(1)} °C`;
-                document.getElementById('humidity-value').textContent = `${latest.humidity.toFixed(1)} %`;
-                document.getElementById('rainfall-value').textContent = `${latest.rainfall_mm.toFixed(1)} mm`;
-                document.getElementById('seismic-value').textContent = `${latest.earthquake_magnitude.toFixed(1)} M`;
-                
-                // Update charts
+            // Update charts (the history view is drawn by updateSensorHistory)
+            if (sensorRange.value === 'live') {
                 const timestamps = data.map(row => new Date(row.timestamp * 1000).toLocaleTimeString()).reverse();
                 const rainfall = data.map(row => row.rainfall_mm).reverse();
                 const seismic = data.map(row => row.earthquake_magnitude).reverse();
-                
-                rainfallChart.data.labels = timestamps;
-                rainfallChart.data.datasets[0].data = rainfall;
-                rainfallChart.update();
-                
-                seismicChart.data.labels = timestamps;
-                seismicChart.data.datasets[0].data = seismic;
-                seismicChart.update();
-                
-                // Check for alerts
-                checkForAlerts(latest);
+                updateSensorCharts(timestamps, rainfall, seismic);
             }
             
-            // Get stats
+            // Check for alerts
+            checkForAlerts(latest);
+        }
+    }
+
+    function setConnectionStatus(online) {
+        const status = document.getElementById('sensor-connection-status');
+        status.className = online ? 'status-online' : 'status-offline';
+        status.textContent = online ? 'Online' : 'Offline';
+    }
+
+    const sensorEvents = new EventSource('/sensor/stream?rate=1');
+    sensorEvents.onopen = () => setConnectionStatus(true);
+    sensorEvents.onmessage = function(event) {
+        const readings = JSON.parse(event.data);
+        liveReadings = readings.reverse().concat(liveReadings).slice(0, 20);
+        setConnectionStatus(true);
+        renderLiveReadings(liveReadings);
+    };
+    sensorEvents.onerror = function() {
+        setConnectionStatus(false);  // The browser reconnects by itself
+    };
+
+    function updateSensorData() {
+        renderLiveReadings(liveReadings);
+    }
+
+    async function updateSensorStats() {
+        try {
             const statsResponse = await fetch('/sensor/stats');
             const stats = await statsResponse.json();
             
@@ -252,12 +262,47 @@ document.addEventListener('DOMContentLoaded', function() {
             document.getElementById('seismic-min').textContent = `${stats.earthquake_magnitude.min.toFixed(1)}M`;
             
         } catch (error) {
-            console.error('Error fetching sensor data:', error);
-            document.getElementById('sensor-connection-status').className = 'status-offline';
-            document.getElementById('sensor-connection-status').textContent = 'Offline';
+            console.error('Error fetching sensor stats:', error);
         }
     }
     
+    function updateSensorCharts(labels, rainfall, seismic) {
+        rainfallChart.data.labels = labels;
+        rainfallChart.data.datasets[0].data = rainfall;
+        rainfallChart.update();
+
+        seismicChart.data.labels = labels;
+        seismicChart.data.datasets[0].data = seismic;
+        seismicChart.update();
+    }
+
+    // Week- and month-long views come from the server-side rollups, one point per bucket
+    const sensorRange = document.getElementById('sensor-range');
+
+    async function updateSensorHistory() {
+        if (sensorRange.value === 'live') {
+            return updateSensorData();
+        }
+        try {
+            const now = Math.floor(Date.now() / 1000);
+            const response = await fetch(`/sensor/query?from=${now - parseInt(sensorRange.value, 10)}&to=${now}&metrics=rainfall_mm,earthquake_magnitude`);
+            const result = await response.json();
+            const labels = result.points.map(point => {
+                const date = new Date(point.bucket_start * 1000);
+                return result.bucket >= 86400 ? date.toLocaleDateString() : date.toLocaleString([], { month: 'short', day: 'numeric', hour: '2-digit', minute: '2-digit' });
+            });
+            updateSensorCharts(
+                labels,
+                result.points.map(point => point.rainfall_mm.max),
+                result.points.map(point => point.earthquake_magnitude.max)
+            );
+        } catch (error) {
+            console.error('Error fetching sensor history:', error);
+        }
+    }
+
+    sensorRange.addEventListener('change', updateSensorHistory);
+
     // Function to check for alert conditions
     function checkForAlerts(data) {
         const alertList = document.getElementById('sensor-alert-list');
@@ -331,11 +376,12 @@ document.addEventListener('DOMContentLoaded', function() {
 
     // Initial updates
     updateOverviewData();
-    updateSensorData();
+    updateSensorStats();
     
-    // Set up periodic updates
+    // Set up periodic updates (live readings arrive over /sensor/stream)
     setInterval(updateOverviewData, 30000); // Every 30 seconds
-    setInterval(updateSensorData, 5000); // Every 5 seconds
+    setInterval(updateSensorStats, 30000); // Every 30 seconds
+    setInterval(() => { if (sensorRange.value !== 'live') updateSensorHistory(); }, 60000); // History moves slowly
     
     // Improved resize handling
     function handleResize() {
@@ -27,18 +27,39 @@ document.addEventListener("DOMContentLoaded", function () {
     let searchResults = [];  
     let searchActive = false;
 
+    const tableRowLimit = 1000; // Newest incidents loaded into the table; charts and counts come from the rollups
+
+    function toEpoch(date) {
+        return Math.floor(date.getTime() / 1000);
+    }
+
+    function fetchJson(url) {
+        return fetch(url).then(response => response.json());
+    }
+
     function fetchData(timeframe) {
-        fetch("/api/incidents")
-            .then(response => response.json())
-            .then(data => {
-                updateEventTypes(data);
-                processIncidentData(data, timeframe);
+        const today = new Date();
+        const rangeStart = timeframe === "weekly"
+            ? new Date(today.getFullYear(), today.getMonth(), today.getDate() - 30)
+            : new Date(today.getFullYear(), 0, 1);
+        const bucket = timeframe === "weekly" ? "day" : "month";
+        const startOfWeek = new Date(today.getFullYear(), today.getMonth(), today.getDate() - today.getDay());
+        const from = toEpoch(rangeStart);
+
+        Promise.all([
+            fetchJson(`/api/incidents/summary?bucket=${bucket}&from=${from}&group_by=event_type,location`),
+            fetchJson(`/api/incidents/summary?bucket=day&from=${toEpoch(startOfWeek)}&group_by=`),
+            fetchJson(`/api/incidents?from=${from}&limit=${tableRowLimit}`)
+        ])
+            .then(([summary, thisWeek, incidents]) => {
+                updateEventTypes(summary);
+                processIncidentData(summary, thisWeek, incidents, timeframe, today);
             })
             .catch(error => console.error("Error loading incident data:", error));
     }
 
-    function updateEventTypes(data) {
-        const uniqueEvents = new Set(data.map(incident => incident.event_type));
+    function updateEventTypes(summary) {
+        const uniqueEvents = new Set(summary.map(row => row.event_type));
         eventTypes = Array.from(uniqueEvents);
     }
 
@@ -102,76 +123,37 @@ document.addEventListener("DOMContentLoaded", function () {
         };
     }
     
-    function processIncidentData(data, timeframe) {
-        const categorizedData = initializeCategorizedData();
-        const today = new Date();
-        const currentYear = today.getFullYear();
-    
-        data.forEach(incident => {
-            const { date, time } = parseCustomDateTime(incident.detected_at);
-            const incidentDate = new Date(date);
-            const incidentYear = incidentDate.getFullYear();
-    
-            if (incidentYear === currentYear) {
-                updateCategorizedData(categorizedData, "monthly", incident, date, time, today);
-            }
-    
-            const daysDifference = (today - incidentDate) / (1000 * 60 * 60 * 24);
-            if (daysDifference <= 30) {
-                updateCategorizedData(categorizedData, "weekly", incident, date, time, today);
-            }
-        });
-    
-        updateUI(categorizedData, timeframe);
-    }   
-    
-    function initializeCategorizedData() {
-        return {
-            weekly: { count: 0, history: Array(5).fill(0), events: Array(6).fill(0), table: [] },
-            monthly: { count: 0, history: Array(12).fill(0), events: Array(6).fill(0), table: [] }
+    function processIncidentData(summary, thisWeek, incidents, timeframe, today) {
+        const categorizedData = {
+            count: 0,
+            thisWeek: thisWeek.reduce((total, row) => total + row.count, 0),
+            history: Array(timeframe === "weekly" ? 5 : 12).fill(0),
+            events: eventTypes.map(() => 0),
+            locations: {},
+            table: incidents.map(incident => {
+                const { date, time } = parseCustomDateTime(incident.detected_at);
+                return [date, time, incident.event_type, incident.camera_title, incident.location];
+            })
         };
-    }
-    
-    function updateCategorizedData(categorizedData, category, incident, date, time, today) {
-        categorizedData[category].count++;
-        categorizedData[category].table.push([date, time, incident.event_type, incident.camera_title, incident.location]);
-    
-        const eventIndex = eventTypes.indexOf(incident.event_type);
-        if (eventIndex !== -1) {
-            categorizedData[category].events[eventIndex]++;
-        }
-    
-        const incidentDate = new Date(date);
-    
-        if (category === "weekly") {
-            const monthStart = new Date(today.getFullYear(), today.getMonth(), 1);
-            const weekIndex = Math.floor((incidentDate - monthStart) / (1000 * 60 * 60 * 24 * 7));
-            if (weekIndex < 5) {
-                categorizedData[category].history[weekIndex]++;
-            }
-        } else if (category === "monthly") {
-            const monthIndex = incidentDate.getMonth();
-            categorizedData[category].history[monthIndex]++;
-        }
-    }
+        const monthStart = new Date(today.getFullYear(), today.getMonth(), 1);
 
-    function updateIncidentThisWeekCount(categorizedData) {
-        const today = new Date();
-        const startOfWeek = new Date(today);
-        startOfWeek.setDate(today.getDate() - today.getDay()); // Set to Sunday of the current week
-        startOfWeek.setHours(0, 0, 0, 0);
-    
-        let thisWeekCount = 0;
-    
-        categorizedData.monthly.table.forEach(([date]) => {
-            const incidentDate = new Date(date);
-    
-            if (incidentDate >= startOfWeek && incidentDate <= today) {
-                thisWeekCount++;
+        summary.forEach(row => {
+            const bucketDate = new Date(row.bucket_start * 1000);
+            categorizedData.count += row.count;
+            categorizedData.events[eventTypes.indexOf(row.event_type)] += row.count;
+            categorizedData.locations[row.location] = (categorizedData.locations[row.location] || 0) + row.count;
+
+            if (timeframe === "weekly") {
+                const weekIndex = Math.floor((bucketDate - monthStart) / (1000 * 60 * 60 * 24 * 7));
+                if (weekIndex >= 0 && weekIndex < 5) {
+                    categorizedData.history[weekIndex] += row.count;
+                }
+            } else {
+                categorizedData.history[bucketDate.getMonth()] += row.count;
             }
         });
-    
-        incidentThisWeekCount.textContent = thisWeekCount;
+
+        updateUI(categorizedData, timeframe);
     }
 
     // Load the persisted timeframe from localStorage when the page loads
@@ -200,17 +182,7 @@ document.addEventListener("DOMContentLoaded", function () {
     // Listen for storage changes (in case another tab updates the device count)
     window.addEventListener("storage", updateCamerasActive);
 
-    function updateMostAffectedLocation(data) {
-        const locationCounts = {};
-    
-        data.forEach(([date, time, eventType, location]) => {
-            if (location in locationCounts) {
-                locationCounts[location]++;
-            } else {
-                locationCounts[location] = 1;
-            }
-        });
-    
+    function updateMostAffectedLocation(locationCounts) {
         // Determine the most affected location
         let mostAffectedLocation = "N/A";
         let maxCount = 0;
@@ -226,18 +198,12 @@ document.addEventListener("DOMContentLoaded", function () {
     }
     
     function updateUI(categorizedData, timeframe) {
-        incidentCount.textContent = categorizedData[timeframe].count;
-        updateIncidentThisWeekCount(categorizedData);
-        updateLineChart(categorizedData[timeframe].history, timeframe);
-    
-        // Ensure pie chart data is aligned with eventTypes
-        const alignedEventData = eventTypes.map(type => {
-            return categorizedData[timeframe].table.filter(row => row[2] === type).length;
-        });
-    
-        updatePieChart(alignedEventData);
-        updateIncidentTable(categorizedData[timeframe].table);
-        updateMostAffectedLocation(categorizedData[timeframe].table);
+        incidentCount.textContent = categorizedData.count;
+        incidentThisWeekCount.textContent = categorizedData.thisWeek;
+        updateLineChart(categorizedData.history, timeframe);
+        updatePieChart(categorizedData.events);
+        updateIncidentTable(categorizedData.table);
+        updateMostAffectedLocation(categorizedData.locations);
     }
     
     
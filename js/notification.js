@@ -148,9 +148,9 @@ document.addEventListener('DOMContentLoaded', function () {
             }).catch(error => console.error('Pushover notification error:', error));
         };
 
+        // The browser reconnects on its own and resumes from the last alert id it received
         window.eventSource.onerror = function (error) {
-            console.error('SSE error:', error);
-            window.eventSource.close();
+            console.error('SSE error, reconnecting:', error);
         };
     }
 
@@ -81,7 +81,6 @@ document.addEventListener('DOMContentLoaded', function () {
     };
 
     eventSource.onerror = function() {
-        console.error("EventSource connection error. Retrying...");
-        eventSource.close();
+        console.error("EventSource connection error. Retrying...");  // Resumes from the last alert id
     };
 });
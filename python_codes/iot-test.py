@@ -1,5 +1,6 @@
 import requests
 import random
+import json
 from time import time, sleep
 
 BASE_URL = "http://localhost:5500"
@@ -46,5 +47,34 @@ def test_sensor_endpoints():
     print(f"Response: {response.status_code}")
     print(f"Stats: {response.json()}")
 
+def random_reading(node_id):
+    return {
+        "node_id": node_id,
+        "timestamp": int(time()),
+        "accel_x": random.uniform(-2.0, 2.0),
+        "accel_y": random.uniform(-2.0, 2.0),
+        "accel_z": random.uniform(8.0, 10.0),
+        "rain_percentage": random.uniform(0, 100),
+        "temperature": random.uniform(20, 35),
+        "humidity": random.uniform(30, 90),
+        "rainfall_mm": random.uniform(0, 50),
+        "earthquake_magnitude": random.uniform(0, 3)
+    }
+
+def test_batch_ingestion(nodes=100, readings_per_node=10):
+    readings = [random_reading(node_id) for node_id in range(1, nodes + 1) for _ in range(readings_per_node)]
+
+    print(f"\nPosting {len(readings)} readings as a JSON array...")
+    start = time()
+    response = requests.post(f"{BASE_URL}/sensor/data/batch", json=readings)
+    print(f"Response: {response.status_code} in {time() - start:.3f}s - accepted {response.json().get('accepted')}")
+
+    print("\nPosting the same readings as NDJSON, with one invalid line...")
+    lines = [json.dumps(reading) for reading in readings] + ['{"timestamp": "not a time"}']
+    response = requests.post(f"{BASE_URL}/sensor/data/batch", data="\n".join(lines),
+                             headers={"Content-Type": "application/x-ndjson"})
+    print(f"Response: {response.status_code} - {response.json()}")
+
 if __name__ == "__main__":
     test_sensor_endpoints()
+    test_batch_ingestion()
@@ -0,0 +1,212 @@
+"""
+Headless benchmark for the streaming pipeline.
+
+Feeds local video files through the same stages the live /stream producer uses
+(resize, process_frame/detect_objects, overlay_metrics, encode_frame and optionally
+the HLS playback recorder) for 1..N simulated cameras, without a browser or network.
+
+Example:
+    python python_codes/pipeline-benchmark.py --videos samples/road.mp4 --cameras 4 --frames 300 --output bench.json
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+# Run on CPU with no audio device unless asked otherwise (must be set before app is imported)
+parser = argparse.ArgumentParser(description="Benchmark the LUKA streaming pipeline on recorded video.")
+parser.add_argument("--videos", nargs="+", required=True, help="Video files; cameras cycle through them")
+parser.add_argument("--cameras", type=int, default=1, help="Run every concurrency level from 1 to this many cameras")
+parser.add_argument("--frames", type=int, default=300, help="Frames processed per camera for each run")
+parser.add_argument("--warmup", type=int, default=10, help="Frames per camera excluded from the statistics")
+parser.add_argument("--device", default="cpu", choices=["cpu", "cuda"], help="Inference device")
+parser.add_argument("--model-version", default=None, help="Model under model/ to benchmark (defaults to app setting)")
+parser.add_argument("--resolution", default=None, help="stream_resolution setting, e.g. 720p")
+parser.add_argument("--no-detection", action="store_true", help="Disable YOLO detection")
+parser.add_argument("--bounding-box", action="store_true", help="Draw bounding boxes and confidence labels")
+parser.add_argument("--overlay", action="store_true", help="Enable the performance metrics overlay")
+parser.add_argument("--motion-gate", action="store_true", help="Use the per-camera motion gate")
+parser.add_argument("--record", action="store_true", help="Also write HLS recordings (to a temporary folder)")
+parser.add_argument("--output", default="benchmark-results.json", help="Where to save the JSON results")
+args = parser.parse_args()
+
+if args.device == "cpu":
+    os.environ["CUDA_VISIBLE_DEVICES"] = ""
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+# app.py uses paths relative to the project root, so resolve user paths before changing directory
+args.videos = [os.path.abspath(path) for path in args.videos]
+args.output = os.path.abspath(args.output)
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+os.chdir(PROJECT_ROOT)
+sys.path.insert(0, PROJECT_ROOT)
+
+import cv2
+import numpy as np
+import psutil
+import app as pipeline
+
+STAGES = ["capture_read", "resize", "inference", "drawing", "jpeg_encode", "hls_write"]
+
+def configure_pipeline(playback_dir):
+    """Apply benchmark settings to the app's globals, with all alerting and logging off."""
+    pipeline.detection_mode = not args.no_detection
+    pipeline.show_bounding_box = args.bounding_box
+    pipeline.show_confidence_value = args.bounding_box
+    pipeline.performance_metrics_toggle = args.overlay
+    pipeline.motion_gate_enabled = args.motion_gate
+    pipeline.enable_alert = False
+    pipeline.enable_record_logging = False
+    pipeline.playback_path = playback_dir
+    if args.resolution:
+        pipeline.stream_resolution = args.resolution
+    if args.model_version and args.model_version != pipeline.model_version:
+        pipeline.model_version = args.model_version
+        pipeline.model_registry.load_and_activate(args.model_version)
+
+def open_video(path):
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise SystemExit(f"Cannot open video: {path}")
+    return cap
+
+def run_camera(camera_index, video_path, frame_limit, samples, start_barrier, recorder_stats):
+    """
+    Simulate one camera: push frame_limit frames of the video through every stage. hls_write only
+    times handing the frame to the recorder, so the recorder's own stats are collected once it drains.
+    """
+    device_id = f"bench{camera_index}"
+    cap = open_video(video_path)
+    metrics = pipeline.initialize_metrics()
+    motion_gate = pipeline.MotionGate(device_id) if args.motion_gate else None
+    recorder = None
+
+    start_barrier.wait()
+    try:
+        for _ in range(frame_limit):
+            frame_start_time = time.time()
+            success, frame = cap.read()
+            if not success:  # Loop the recording
+                cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                success, frame = cap.read()
+                if not success:
+                    break
+            stage_times = {"capture_read": time.time() - frame_start_time}
+
+            frame = pipeline.render_frame(frame, frame_start_time, video_path, device_id, "Benchmark", device_id,
+                                          metrics, motion_gate, stage_times)
+
+            encode_start = time.time()
+            pipeline.encode_frame(frame)
+            stage_times["jpeg_encode"] = time.time() - encode_start
+
+            if args.record:
+                hls_start = time.time()
+                if recorder is None:
+                    recorder = pipeline.get_playback_recorder(device_id, "Benchmark", device_id, video_path)
+                recorder.write(frame)
+                stage_times["hls_write"] = time.time() - hls_start
+
+            stage_times["total"] = time.time() - frame_start_time
+            samples.append(stage_times)
+    finally:
+        cap.release()
+        if recorder is not None:
+            pipeline.close_playback_recorder(device_id)  # Waits for the recorder to drain its queue
+            recorder_stats.append(recorder.stats())
+
+def summarize(values):
+    values = np.asarray(values) * 1000  # milliseconds
+    return {
+        "mean_ms": float(values.mean()),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "samples": int(values.size)
+    }
+
+def run_benchmark(camera_count):
+    process = psutil.Process()
+    samples_per_camera = [[] for _ in range(camera_count)]
+    recorder_stats = []
+    start_barrier = threading.Barrier(camera_count + 1)
+    threads = [
+        threading.Thread(target=run_camera, args=(i, args.videos[i % len(args.videos)], args.frames + args.warmup,
+                                                  samples_per_camera[i], start_barrier, recorder_stats), daemon=True)
+        for i in range(camera_count)
+    ]
+    for thread in threads:
+        thread.start()
+
+    peak_rss = process.memory_info().rss
+    start_barrier.wait()
+    run_start = time.time()
+    while any(thread.is_alive() for thread in threads):
+        peak_rss = max(peak_rss, process.memory_info().rss)
+        time.sleep(0.05)
+    elapsed = time.time() - run_start
+
+    processed_frames = sum(len(camera_samples) for camera_samples in samples_per_camera)
+    samples = [stage_times for camera_samples in samples_per_camera for stage_times in camera_samples[args.warmup:]]
+    stages = {
+        stage: summarize([stage_times[stage] for stage_times in samples if stage in stage_times])
+        for stage in STAGES + ["total"]
+        if any(stage in stage_times for stage_times in samples)
+    }
+    run = {
+        "cameras": camera_count,
+        "frames": processed_frames,
+        "measured_frames": len(samples),
+        "elapsed_s": elapsed,
+        "fps_total": processed_frames / elapsed if elapsed > 0 else 0,
+        "fps_per_camera": processed_frames / elapsed / camera_count if elapsed > 0 else 0,
+        "peak_rss_mb": peak_rss / (1024 * 1024),
+        "stages": stages,
+        "inference": pipeline.inference_scheduler.stats()
+    }
+    if args.record:
+        run["recording"] = {
+            "frames_written": sum(stats.get("frames_written", 0) for stats in recorder_stats),
+            "frames_dropped": sum(stats.get("frames_dropped", 0) for stats in recorder_stats),
+            "recorders": recorder_stats
+        }
+    return run
+
+def main():
+    with tempfile.TemporaryDirectory(prefix="luka-bench-") as playback_dir:
+        configure_pipeline(playback_dir)
+        results = {
+            "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "settings": {
+                "videos": args.videos,
+                "device": args.device,
+                "model_version": pipeline.model_version,
+                "stream_resolution": pipeline.stream_resolution,
+                "inference_size": pipeline.inference_size,
+                "detection": pipeline.detection_mode,
+                "overlay": args.overlay,
+                "motion_gate": args.motion_gate,
+                "record": args.record,
+                "frames_per_camera": args.frames
+            },
+            "runs": []
+        }
+
+        for camera_count in range(1, args.cameras + 1):
+            run = run_benchmark(camera_count)
+            results["runs"].append(run)
+            print(f"{camera_count} camera(s): {run['fps_total']:.1f} fps total, {run['fps_per_camera']:.1f} fps/camera, "
+                  f"p95 frame {run['stages']['total']['p95_ms']:.1f} ms, peak RSS {run['peak_rss_mb']:.0f} MB")
+            if "recording" in run:
+                print(f"  recording: {run['recording']['frames_written']} frames written, "
+                      f"{run['recording']['frames_dropped']} dropped")
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Simulates many sensor nodes sending binary readings to the LUKA sensor listener.
+
+Each reading is packed with the same layout as app.py's SENSOR_RECORD_FORMAT:
+uint32 timestamp, float32 accel_x, accel_y, accel_z, rain_percentage, temperature, humidity,
+rainfall_mm, earthquake_magnitude, uint16 node id (little-endian, 38 bytes).
+
+Example:
+    python python_codes/sensor-simulator.py --nodes 200 --rate 50 --duration 30 --transport udp
+"""
+import argparse
+import math
+import random
+import socket
+import struct
+import time
+
+SENSOR_RECORD_FORMAT = "<I8fH"  # Keep in step with app.py
+RECORDS_PER_PACKET = 32  # Readings a node sends together (about 1.2 KB, fits one UDP datagram)
+
+parser = argparse.ArgumentParser(description="Send simulated binary sensor readings to the LUKA listener.")
+parser.add_argument("--host", default="127.0.0.1")
+parser.add_argument("--port", type=int, default=5600)
+parser.add_argument("--transport", default="udp", choices=["udp", "tcp"])
+parser.add_argument("--nodes", type=int, default=10, help="Number of simulated nodes")
+parser.add_argument("--rate", type=float, default=20, help="Readings per second per node")
+parser.add_argument("--duration", type=float, default=10, help="Seconds to run")
+parser.add_argument("--quake-at", type=float, default=None, help="Seconds into the run to simulate a quake on every node")
+args = parser.parse_args()
+
+def reading(node_id, now, elapsed):
+    shaking = args.quake_at is not None and args.quake_at <= elapsed < args.quake_at + 5
+    amplitude = 3.0 if shaking else 0.05
+    return struct.pack(
+        SENSOR_RECORD_FORMAT,
+        int(now),
+        random.gauss(0, amplitude),
+        random.gauss(0, amplitude),
+        9.81 + random.gauss(0, amplitude),
+        random.uniform(0, 100),
+        28 + 3 * math.sin(elapsed / 60),
+        random.uniform(40, 90),
+        random.uniform(0, 0.001),  # rainfall_mm since the previous reading
+        random.uniform(3.5, 5.0) if shaking else random.uniform(0, 1.0),
+        node_id
+    )
+
+def main():
+    if args.transport == "udp":
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        send = lambda payload: sock.sendto(payload, (args.host, args.port))
+    else:
+        sock = socket.create_connection((args.host, args.port))
+        send = sock.sendall
+
+    # Nodes buffer readings and send RECORDS_PER_PACKET at a time, like firmware batching over Wi-Fi
+    packet_interval = RECORDS_PER_PACKET / args.rate
+    buffers = {node_id: [] for node_id in range(1, args.nodes + 1)}
+    start = time.time()
+    next_sample = start
+    sent_records = 0
+    sent_packets = 0
+    while time.time() - start < args.duration:
+        now = time.time()
+        for node_id, buffer in buffers.items():
+            buffer.append(reading(node_id, now, now - start))
+            if len(buffer) >= RECORDS_PER_PACKET:
+                send(b"".join(buffer))
+                sent_records += len(buffer)
+                sent_packets += 1
+                buffer.clear()
+        next_sample += 1 / args.rate
+        time.sleep(max(0, next_sample - time.time()))
+
+    elapsed = time.time() - start
+    print(f"Sent {sent_records} readings in {sent_packets} packets over {elapsed:.1f}s "
+          f"({sent_records / elapsed:.0f} readings/s, packet every {packet_interval:.2f}s per node)")
+    sock.close()
+
+if __name__ == "__main__":
+    main()